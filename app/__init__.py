@@ -9,6 +9,7 @@ from app.routes.auth import auth_bp
 from app.routes.ticket import ticket_bp
 from app.routes.admin import admin_bp
 from app.database import Database
+from app import query_trace, profiling, session_store
 
 
 def create_app():
@@ -18,6 +19,9 @@ def create_app():
     app.config.from_object(Config)
     
     Database.init_pool()
+    query_trace.init_app(app)
+    profiling.init_app(app)
+    session_store.init_app(app)
     
     CORS(app, supports_credentials=True)
     
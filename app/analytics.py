@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+列式内存分析（可选模块，Config.ANALYTICS_ENABLED 开启）
+把 Order、Refund 及班次维度数据快照为紧凑的定长数组列（array 模块），
+按自增ID水位增量追加新数据，报表分组统计在内存中完成，不再对 MySQL 做 GROUP BY
+
+安装了 NumPy 时分组统计使用向量化运算（np.frombuffer 零拷贝读取数组列 + bincount），
+否则退化为逐行循环，结果相同
+
+增量刷新的约束：
+    - 只追加 ID 大于水位且创建时间早于 ANALYTICS_WATERMARK_LAG 秒之前的行，
+      避免自增ID较小但提交较晚的事务被跳过
+    - 订单状态只会因退票由 confirmed 变为 refunded，处理新的退票记录时同步修正
+    - 班次按 schedule_id 水位追加，之后对班次日期/车辆的修改不会反映到快照中
+"""
+import operator
+import threading
+import time
+from array import array
+from datetime import date, datetime, timedelta
+from app.config import Config
+from app.database import db
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+
+_NUMPY_DTYPES = {'q': 'int64', 'd': 'float64'}
+_OPERATORS = {'>=': operator.ge, '<': operator.lt, '==': operator.eq}
+
+
+class ColumnTable:
+    """定长数组列组成的表（只追加，个别列可按行号修改）"""
+
+    def __init__(self, **columns):
+        # columns: 列名 -> array 类型码（'q' 整数，'d' 浮点）
+        self.columns = {name: array(typecode) for name, typecode in columns.items()}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def append(self, **values):
+        for name, column in self.columns.items():
+            column.append(values[name])
+
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in self.columns.values())
+
+    def aggregate(self, key, conditions, sums):
+        """
+        分组求和
+        :param key: 分组列
+        :param conditions: [(列名, '>=' / '<' / '==', 值), ...]
+        :param sums: 求和的列名列表
+        :return: {分组值: {列名: 合计, 'rows': 行数}}
+        """
+        if not len(self):
+            return {}
+        if np is not None:
+            return self._aggregate_numpy(key, conditions, sums)
+
+        columns = self.columns
+        result = {}
+        for row in range(len(self)):
+            if all(_OPERATORS[op](columns[name][row], value) for name, op, value in conditions):
+                group = result.get(columns[key][row])
+                if group is None:
+                    group = result[columns[key][row]] = dict.fromkeys(sums, 0)
+                    group['rows'] = 0
+                group['rows'] += 1
+                for name in sums:
+                    group[name] += columns[name][row]
+        return result
+
+    def _aggregate_numpy(self, key, conditions, sums):
+        def view(name):
+            column = self.columns[name]
+            return np.frombuffer(column, dtype=_NUMPY_DTYPES[column.typecode])
+
+        mask = np.ones(len(self), dtype=bool)
+        for name, op, value in conditions:
+            mask &= _OPERATORS[op](view(name), value)
+        if not mask.any():
+            return {}
+
+        groups, inverse = np.unique(view(key)[mask], return_inverse=True)
+        counts = np.bincount(inverse)
+        totals = {name: np.bincount(inverse, weights=view(name)[mask]) for name in sums}
+
+        result = {}
+        for index, group in enumerate(groups.tolist()):
+            row = {name: totals[name][index].item() for name in sums}
+            row['rows'] = int(counts[index])
+            result[group] = row
+        return result
+
+
+def _day(value):
+    """日期转换为序数，便于按整数比较和分组"""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal()
+
+
+def _format_day(ordinal):
+    return date.fromordinal(int(ordinal)).strftime('%Y-%m-%d')
+
+
+class AnalyticsEngine:
+    """报表分析快照"""
+
+    def __init__(self):
+        self.schedules = ColumnTable(schedule_id='q', route_id='q', day='q', seat_count='q', sold='q')
+        # 订单的金额/票数列只统计有效（confirmed）订单，退票后转入 refunded_amount
+        self.orders = ColumnTable(
+            order_id='q', route_id='q', day='q', confirmed='q', refunded='q',
+            tickets='q', amount='d', refunded_amount='d', group_orders='q'
+        )
+        self.refunds = ColumnTable(refund_id='q', route_id='q', day='q', amount='d')
+        self.schedule_rows = {}   # schedule_id -> 行号
+        self.order_rows = {}      # order_id -> 行号
+        self.watermarks = {'schedule': 0, 'order': 0, 'ticket': 0, 'refund': 0}
+        self.refreshed_at = 0
+        self._lock = threading.Lock()
+
+    # ---------- 增量刷新 ----------
+
+    def refresh(self, force=False):
+        """距上次刷新超过 ANALYTICS_REFRESH_INTERVAL 秒（或 force）时追加新数据"""
+        with self._lock:
+            if not force and time.time() - self.refreshed_at < Config.ANALYTICS_REFRESH_INTERVAL:
+                return False
+            cutoff = datetime.now() - timedelta(seconds=Config.ANALYTICS_WATERMARK_LAG)
+            self._load_schedules()
+            self._load_orders(cutoff)
+            self._load_tickets(cutoff)
+            self._load_refunds(cutoff)
+            self.refreshed_at = time.time()
+            return True
+
+    def _fetch(self, name, sql, cutoff=None, time_column=None):
+        """按ID水位分批读取新行，遇到晚于 cutoff 的行即停止"""
+        while True:
+            rows = db.execute_query(sql, (self.watermarks[name], Config.ANALYTICS_FETCH_SIZE))
+            for row in rows:
+                if cutoff is not None and row[time_column] is not None and row[time_column] > cutoff:
+                    return
+                yield row
+                self.watermarks[name] = row['id']
+            if len(rows) < Config.ANALYTICS_FETCH_SIZE:
+                return
+
+    def _load_schedules(self):
+        for row in self._fetch('schedule', """
+                SELECT s.schedule_id AS id, s.route_id, s.departure_date, v.seat_count
+                FROM Schedule s JOIN Vehicle v ON s.vehicle_id = v.vehicle_id
+                WHERE s.schedule_id > %s ORDER BY s.schedule_id LIMIT %s"""):
+            self.schedule_rows[row['id']] = len(self.schedules)
+            self.schedules.append(
+                schedule_id=row['id'], route_id=row['route_id'],
+                day=_day(row['departure_date']), seat_count=row['seat_count'], sold=0
+            )
+
+    def _route_of(self, schedule_id):
+        index = self.schedule_rows.get(schedule_id)
+        return self.schedules.columns['route_id'][index] if index is not None else 0
+
+    def _load_orders(self, cutoff):
+        for row in self._fetch('order', """
+                SELECT order_id AS id, schedule_id, order_time, ticket_count, total_amount, order_type, status
+                FROM `Order` WHERE order_id > %s ORDER BY order_id LIMIT %s""", cutoff, 'order_time'):
+            confirmed = row['status'] == 'confirmed'
+            refunded = row['status'] == 'refunded'
+            amount = float(row['total_amount'])
+            self.order_rows[row['id']] = len(self.orders)
+            self.orders.append(
+                order_id=row['id'], route_id=self._route_of(row['schedule_id']), day=_day(row['order_time']),
+                confirmed=int(confirmed), refunded=int(refunded),
+                tickets=row['ticket_count'] if confirmed else 0,
+                amount=amount if confirmed else 0.0,
+                refunded_amount=amount if refunded else 0.0,
+                group_orders=int(confirmed and row['order_type'] == 'group')
+            )
+
+    def _load_tickets(self, cutoff):
+        """车票只用于班次已售张数：新车票计入，退票时扣除"""
+        sold = self.schedules.columns['sold']
+        for row in self._fetch('ticket', """
+                SELECT ticket_id AS id, schedule_id, created_at
+                FROM Ticket WHERE ticket_id > %s ORDER BY ticket_id LIMIT %s""", cutoff, 'created_at'):
+            index = self.schedule_rows.get(row['schedule_id'])
+            if index is not None:
+                sold[index] += 1
+
+    def _load_refunds(self, cutoff):
+        sold = self.schedules.columns['sold']
+        order_ids = set()
+        for row in self._fetch('refund', """
+                SELECT r.refund_id AS id, r.refund_time, r.refund_amount, t.ticket_id, t.order_id, t.schedule_id
+                FROM Refund r JOIN Ticket t ON r.ticket_id = t.ticket_id
+                WHERE r.refund_id > %s ORDER BY r.refund_id LIMIT %s""", cutoff, 'refund_time'):
+            if row['ticket_id'] > self.watermarks['ticket']:
+                # 车票尚未计入快照，下次刷新再处理这条退票
+                break
+            self.refunds.append(
+                refund_id=row['id'], route_id=self._route_of(row['schedule_id']),
+                day=_day(row['refund_time']), amount=float(row['refund_amount'])
+            )
+            index = self.schedule_rows.get(row['schedule_id'])
+            if index is not None:
+                sold[index] -= 1
+            order_ids.add(row['order_id'])
+        self._apply_order_refunds(order_ids)
+
+    def _apply_order_refunds(self, order_ids):
+        """已全部退票的订单从有效订单转入已退订单"""
+        order_ids = [order_id for order_id in order_ids if order_id in self.order_rows]
+        if not order_ids:
+            return
+        columns = self.orders.columns
+        placeholders = ','.join(['%s'] * len(order_ids))
+        for row in db.execute_query(
+            f"SELECT order_id, total_amount FROM `Order` WHERE order_id IN ({placeholders}) AND status = 'refunded'",
+            order_ids
+        ):
+            index = self.order_rows[row['order_id']]
+            if not columns['confirmed'][index]:
+                continue
+            columns['confirmed'][index] = 0
+            columns['refunded'][index] = 1
+            columns['tickets'][index] = 0
+            columns['amount'][index] = 0.0
+            columns['refunded_amount'][index] = float(row['total_amount'])
+            columns['group_orders'][index] = 0
+
+    # ---------- 查询 ----------
+
+    @staticmethod
+    def _day_conditions(start, end):
+        """[start, end) 日期范围（datetime，可为None）转换为过滤条件"""
+        conditions = []
+        if start:
+            conditions.append(('day', '>=', _day(start)))
+        if end:
+            conditions.append(('day', '<', _day(end)))
+        return conditions
+
+    def sales(self, start=None, end=None):
+        with self._lock:
+            groups = self.orders.aggregate(
+                'day', self._day_conditions(start, end),
+                ['confirmed', 'refunded', 'tickets', 'amount', 'refunded_amount', 'group_orders']
+            )
+        report = []
+        for day, row in sorted(groups.items(), reverse=True):
+            if not row['confirmed'] and not row['refunded']:
+                continue
+            report.append({
+                'order_date': _format_day(day),
+                'order_count': int(row['confirmed']),
+                'refunded_count': int(row['refunded']),
+                'ticket_count': int(row['tickets']),
+                'total_sales': round(row['amount'], 2),
+                'refunded_amount': round(row['refunded_amount'], 2),
+                'group_order_count': int(row['group_orders']),
+                'net_revenue': round(row['amount'], 2)
+            })
+        return report
+
+    def refunds_by_day(self, start=None, end=None):
+        with self._lock:
+            groups = self.refunds.aggregate('day', self._day_conditions(start, end), ['amount'])
+        return [
+            {'refund_date': _format_day(day), 'refund_count': row['rows'], 'total_refund_amount': round(row['amount'], 2)}
+            for day, row in sorted(groups.items(), reverse=True)
+        ]
+
+    def route_revenue(self, start=None, end=None):
+        """按线路统计下单日期范围内的有效订单收入和退款"""
+        conditions = self._day_conditions(start, end)
+        with self._lock:
+            orders = self.orders.aggregate('route_id', conditions, ['confirmed', 'tickets', 'amount'])
+            refunds = self.refunds.aggregate('route_id', conditions, ['amount'])
+        report = []
+        for route_id in set(orders) | set(refunds):
+            order_row = orders.get(route_id, {})
+            refund_row = refunds.get(route_id, {})
+            report.append({
+                'route_id': route_id,
+                'order_count': int(order_row.get('confirmed', 0)),
+                'ticket_count': int(order_row.get('tickets', 0)),
+                'total_revenue': round(order_row.get('amount', 0), 2),
+                'refund_count': refund_row.get('rows', 0),
+                'refund_amount': round(refund_row.get('amount', 0), 2)
+            })
+        report.sort(key=lambda row: row['total_revenue'], reverse=True)
+        return report
+
+    def load_factor(self, start=None, end=None, group_by='route'):
+        """
+        上座率：发车日期范围内已售车票数 / 座位数
+        区段售票时同一座位可能售出多张票，上座率可能超过100%
+        """
+        key = 'route_id' if group_by == 'route' else 'day'
+        with self._lock:
+            groups = self.schedules.aggregate(key, self._day_conditions(start, end), ['sold', 'seat_count'])
+        report = []
+        for group, row in sorted(groups.items()):
+            seats = row['seat_count']
+            label = {'route_id': group} if group_by == 'route' else {'departure_date': _format_day(group)}
+            report.append({
+                **label,
+                'schedule_count': row['rows'],
+                'sold_tickets': int(row['sold']),
+                'total_seats': int(seats),
+                'load_factor': round(row['sold'] / seats, 4) if seats else 0
+            })
+        return report
+
+    def status(self):
+        with self._lock:
+            return {
+                'backend': 'numpy' if np is not None else 'array',
+                'rows': {'schedules': len(self.schedules), 'orders': len(self.orders), 'refunds': len(self.refunds)},
+                'memory_bytes': self.schedules.nbytes() + self.orders.nbytes() + self.refunds.nbytes(),
+                'watermarks': dict(self.watermarks),
+                'refreshed_at': datetime.fromtimestamp(self.refreshed_at).strftime('%Y-%m-%d %H:%M:%S')
+                if self.refreshed_at else None
+            }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """获取分析快照（首次调用时创建），返回前按刷新间隔增量更新"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = AnalyticsEngine()
+    _engine.refresh()
+    return _engine
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+订票业务逻辑
+同步订票接口和排队订票的后台工作线程共用这里的事务逻辑
+"""
+from datetime import datetime
+from app.config import Config
+from app.database import db, Database
+from app.inventory import Inventory, SeatOccupancy
+from app.journey import get_route_network
+from app.sales_rollup import SalesRollup
+from app.seat_map import SeatMapCache
+
+
+class BookingRequest:
+    """一次订票请求（已完成参数校验）"""
+
+    __slots__ = ('user_id', 'schedule_id', 'passengers', 'from_station_id', 'to_station_id', 'seat_type')
+
+    def __init__(self, user_id, schedule_id, passengers, from_station_id=None, to_station_id=None, seat_type=None):
+        self.user_id = user_id
+        self.schedule_id = schedule_id
+        self.passengers = passengers  # [{name, card_id, seat_id}, ...]，seat_id 可省略由系统分配
+        self.from_station_id = from_station_id
+        self.to_station_id = to_station_id
+        self.seat_type = seat_type
+
+
+def needs_seat_map(booking):
+    """是否有乘客需要自动选座"""
+    return any(not p.get('seat_id') for p in booking.passengers)
+
+
+def load_booking_context(bookings):
+    """
+    准备订票事务需要的线路网络和座位位图
+    缓存未命中时会从连接池另取连接加载，必须在订票事务取得连接之前调用：
+    否则持有连接和行锁的订票线程会等待第二个连接，并发订票数达到连接池上限时连接池死锁
+    :return: (线路网络, {schedule_id: 座位位图})
+    """
+    network = get_route_network()
+    seat_maps = {}
+    for booking in bookings:
+        if needs_seat_map(booking) and booking.schedule_id not in seat_maps:
+            seat_maps[booking.schedule_id] = SeatMapCache.get(booking.schedule_id)
+    return network, seat_maps
+
+
+def _assign_seats(cursor, schedule_id, seat_map, seat_ids, segment_mask, seat_type=None, for_update=True):
+    """
+    为未指定座位的乘客自动选座，并用一条语句锁定全部座位
+    座位位图可能滞后于数据库，锁定后发现冲突时用数据库中的占用情况修正位图并重新选座
+    :param seat_map: 调用方在取连接前准备好的座位位图（这里不能再访问连接池）
+    :param seat_ids: 乘客的座位ID列表，None 表示需要自动分配
+    :param for_update: 是否锁定座位行（乐观订票时只读取快照）
+    :return: (座位ID列表, 锁定时查到的占用情况)
+    """
+    explicit_seat_ids = {seat_id for seat_id in seat_ids if seat_id}
+
+    for _ in range(Config.AUTO_SEAT_MAX_ATTEMPTS):
+        picked = seat_map.pick_seats(
+            len(seat_ids) - len(explicit_seat_ids), segment_mask, seat_type, explicit_seat_ids
+        ) if seat_map else None
+        if picked is None:
+            raise Exception('余座不足')
+
+        picked = iter(picked)
+        assigned = [seat_id or next(picked) for seat_id in seat_ids]
+
+        occupied = SeatOccupancy.lock(cursor, schedule_id, assigned, for_update)
+        conflicts = {seat_id: mask for seat_id, mask in occupied.items() if mask & segment_mask}
+        if not conflicts:
+            return assigned, occupied
+        if explicit_seat_ids & set(conflicts):
+            raise Exception('所选座位已被占用')
+
+        for seat_id, mask in conflicts.items():
+            SeatMapCache.mark_occupied(schedule_id, [seat_id], mask, seat_map)
+
+    raise Exception('系统繁忙，请稍后重试')
+
+
+def place_order(cursor, booking, network, seat_map=None):
+    """
+    在调用方的事务内完成订票（不提交、不回滚）
+    订票策略：pessimistic 锁定座位行；optimistic 读取快照并在写入前校验库存版本号
+    :param network: 线路网络，seat_map: 该班次的座位位图（需要自动选座时），
+                    均由 load_booking_context 在取连接之前准备
+    :return: (返回给客户端的结果, 提交后需要同步到座位位图的 (schedule_id, seat_ids, segment_mask))
+    """
+    optimistic = Config.BOOKING_STRATEGY == 'optimistic'
+    schedule_id = booking.schedule_id
+    passengers = booking.passengers
+
+    # 判断是否为团体订票
+    order_type = 'group' if len(passengers) > 1 else 'individual'
+
+    # 检查提交的乘客列表中是否有重复的身份证号
+    card_ids = [p['card_id'] for p in passengers]
+    if len(card_ids) != len(set(card_ids)):
+        raise Exception('同一订单中不能包含相同的身份证号')
+
+    # 检查这些身份证号是否已经在该车次订过票
+    card_placeholders = ','.join(['%s'] * len(card_ids))
+    cursor.execute(
+        f"""SELECT card_id FROM Ticket
+            WHERE schedule_id = %s
+            AND card_id IN ({card_placeholders})
+            AND status = 'valid'""",
+        [schedule_id] + card_ids
+    )
+    existing_cards = cursor.fetchall()
+
+    if existing_cards:
+        existing_card_list = ', '.join([c['card_id'] for c in existing_cards])
+        raise Exception(f'身份证号 {existing_card_list} 已在该车次订票，每个身份证号只能订一张票')
+
+    # 未指定 seat_id 的乘客由系统自动选座；指定的座位先转换为整数再检查重复（"12" 与 12 是同一座位）
+    try:
+        seat_ids = [int(p['seat_id']) if p.get('seat_id') else None for p in passengers]
+    except (ValueError, TypeError):
+        raise Exception('座位编号格式不正确')
+    explicit_seat_ids = [seat_id for seat_id in seat_ids if seat_id]
+    if len(explicit_seat_ids) != len(set(explicit_seat_ids)):
+        raise Exception('同一订单中不能重复选择同一座位')
+
+    # 获取票价和线路
+    cursor.execute(
+        "SELECT base_price, route_id FROM Schedule WHERE schedule_id = %s",
+        (schedule_id,)
+    )
+    schedule = cursor.fetchone()
+
+    if not schedule:
+        raise Exception('班次不存在')
+
+    # 计算乘车区段（缺省为全程）
+    route = network.routes.get(schedule['route_id'])
+    segment = route.locate(booking.from_station_id, booking.to_station_id) if route else None
+    if segment is None:
+        raise Exception('上下车站不在该班次线路上或顺序不正确')
+    if len(route.stops) - 1 > SeatOccupancy.MAX_SEGMENTS:
+        raise Exception(f'线路区段数超过 {SeatOccupancy.MAX_SEGMENTS}，无法按区段售票')
+    board, alight = segment
+    segment_mask = route.segment_mask(board, alight)
+
+    if optimistic:
+        # 与后续读取的座位占用属于同一快照
+        version = Inventory.read_version(cursor, schedule_id)
+
+    if len(explicit_seat_ids) < len(seat_ids):
+        seat_ids, occupied = _assign_seats(
+            cursor, schedule_id, seat_map, seat_ids, segment_mask, booking.seat_type, for_update=not optimistic
+        )
+    else:
+        # 读取座位占用（悲观策略下锁定这些行），检查所选区段是否与已售区段重叠
+        occupied = SeatOccupancy.lock(cursor, schedule_id, seat_ids, for_update=not optimistic)
+        if any(occupied.get(seat_id, 0) & segment_mask for seat_id in seat_ids):
+            # 位图与数据库不一致，丢弃该班次的位图以便重新加载
+            SeatMapCache.invalidate(schedule_id)
+            raise Exception('所选座位已被占用')
+
+    # 原本完全空闲的座位才计入已售座位数
+    newly_sold = sum(1 for seat_id in seat_ids if not occupied.get(seat_id, 0))
+
+    if optimistic:
+        # 版本号未变化说明快照仍然有效，同时锁定库存行直到事务结束
+        Inventory.claim(cursor, schedule_id, version, newly_sold)
+
+    price = route.segment_price(float(schedule['base_price']), board, alight)
+    total_amount = round(price * len(passengers), 2)
+
+    # 创建订单
+    order_time = datetime.now()
+    cursor.execute(
+        """INSERT INTO `Order` (user_id, schedule_id, order_time, total_amount, ticket_count, order_type, status)
+           VALUES (%s, %s, %s, %s, %s, %s, 'confirmed')""",
+        (booking.user_id, schedule_id, order_time, total_amount, len(passengers), order_type)
+    )
+    order_id = cursor.lastrowid
+    SalesRollup.record_order(cursor, order_id, schedule_id, order_time, len(passengers), total_amount, order_type)
+
+    # 创建车票（VALUES 中全部使用占位符，executemany 才会合并为一条多行 INSERT）
+    cursor.executemany(
+        """INSERT INTO Ticket (order_id, schedule_id, seat_id, passenger_name, card_id, price,
+                               from_station_id, to_station_id, segment_mask, status)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+        [
+            (order_id, schedule_id, seat_id, passenger['name'],
+             passenger['card_id'], price, route.stops[board][0], route.stops[alight][0],
+             segment_mask, 'valid')
+            for passenger, seat_id in zip(passengers, seat_ids)
+        ]
+    )
+
+    # 更新座位区段占用和班次库存计数（占用失败说明区段已被并发订单售出，由调用方回滚）
+    if not SeatOccupancy.occupy(cursor, schedule_id, seat_ids, segment_mask):
+        SeatMapCache.invalidate(schedule_id)
+        raise Exception('所选座位已被占用')
+    if not optimistic:
+        Inventory.increase_sold(cursor, schedule_id, newly_sold)
+
+    result = {
+        'success': True,
+        'message': '订票成功',
+        'order_id': order_id,
+        'total_amount': total_amount,
+        'seat_ids': seat_ids
+    }
+    return result, (schedule_id, seat_ids, segment_mask)
+
+
+@Database.retry_on_deadlock(max_retries=3)
+@Database.retry_on_conflict(max_retries=Config.OPTIMISTIC_MAX_RETRIES)
+def book(booking):
+    """
+    同步订票（单独一个事务）
+    支持死锁自动重试和乐观锁冲突重试
+    """
+    # 缓存数据在取连接之前加载，事务中不再访问连接池
+    network, seat_maps = load_booking_context([booking])
+
+    conn = db.get_connection()
+    cursor = conn.cursor()
+
+    try:
+        # 开始事务
+        conn.begin()
+
+        result, occupied = place_order(cursor, booking, network, seat_maps.get(booking.schedule_id))
+
+        # 提交事务
+        conn.commit()
+
+        SeatMapCache.mark_occupied(*occupied)
+        return result
+
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
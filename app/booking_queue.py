@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+排队订票
+订票请求按 schedule_id 分片放入队列，每个分片由一个工作线程串行处理，
+同一班次的订票不再在数据库行锁上相互等待；工作线程一次取出一批请求，
+在同一个事务中处理（每个请求一个保存点），减少提交次数
+客户端通过请求编号轮询（或长轮询）订票结果
+"""
+import queue
+import threading
+import time
+import uuid
+import pymysql
+from app.booking import book, load_booking_context, place_order
+from app.config import Config
+from app.database import db, ConcurrentUpdateError
+from app.seat_map import SeatMapCache
+
+
+class _Ticket:
+    """排队中的订票请求及其结果"""
+
+    __slots__ = ('request_id', 'booking', 'status', 'result', 'finished_at')
+
+    def __init__(self, booking):
+        self.request_id = uuid.uuid4().hex
+        self.booking = booking
+        self.status = 'pending'   # pending / completed
+        self.result = None
+        self.finished_at = None
+
+
+class BookingQueue:
+    """按班次分片的订票队列（进程内单例）"""
+
+    _shards = None
+    _tickets = {}   # request_id -> _Ticket
+    _lock = threading.Lock()
+    _finished = threading.Condition(_lock)
+
+    @classmethod
+    def _start(cls):
+        """首次提交时创建分片队列并启动工作线程（调用方持有 _lock）"""
+        cls._shards = []
+        for index in range(Config.BOOKING_QUEUE_SHARDS):
+            shard = queue.Queue(maxsize=Config.BOOKING_QUEUE_MAX_SIZE)
+            worker = threading.Thread(
+                target=cls._run, args=(shard,), name=f'booking-shard-{index}', daemon=True
+            )
+            worker.start()
+            cls._shards.append(shard)
+
+    @classmethod
+    def submit(cls, booking):
+        """
+        提交订票请求
+        :return: 请求编号
+        """
+        ticket = _Ticket(booking)
+        with cls._lock:
+            if cls._shards is None:
+                cls._start()
+            cls._purge()
+            shard = cls._shards[booking.schedule_id % len(cls._shards)]
+            cls._tickets[ticket.request_id] = ticket
+
+        try:
+            shard.put_nowait(ticket)
+        except queue.Full:
+            with cls._lock:
+                del cls._tickets[ticket.request_id]
+            raise Exception('排队人数过多，请稍后重试')
+        return ticket.request_id
+
+    @classmethod
+    def get_result(cls, request_id, user_id, wait=0):
+        """
+        查询订票结果，wait > 0 时最多等待 wait 秒直到处理完成
+        :return: (状态, 结果)，请求不存在或不属于该用户时返回 None
+        """
+        deadline = time.time() + wait
+        with cls._lock:
+            ticket = cls._tickets.get(request_id)
+            if ticket is None or ticket.booking.user_id != user_id:
+                return None
+            while ticket.status == 'pending':
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                cls._finished.wait(remaining)
+            return ticket.status, ticket.result
+
+    @classmethod
+    def stats(cls):
+        """各分片的排队长度"""
+        with cls._lock:
+            shards = cls._shards or []
+            return {
+                'shards': [shard.qsize() for shard in shards],
+                'tracked_requests': len(cls._tickets)
+            }
+
+    @classmethod
+    def _purge(cls):
+        """清理超过保留时间的已完成结果（调用方持有 _lock）"""
+        expire_before = time.time() - Config.BOOKING_RESULT_TTL
+        expired = [
+            request_id for request_id, ticket in cls._tickets.items()
+            if ticket.finished_at is not None and ticket.finished_at < expire_before
+        ]
+        for request_id in expired:
+            del cls._tickets[request_id]
+
+    @classmethod
+    def _finish(cls, ticket, result):
+        with cls._lock:
+            ticket.status = 'completed'
+            ticket.result = result
+            ticket.finished_at = time.time()
+            cls._finished.notify_all()
+
+    @classmethod
+    def _run(cls, shard):
+        """工作线程：阻塞取出一个请求，再顺带取出已排队的请求组成一批"""
+        while True:
+            batch = [shard.get()]
+            while len(batch) < Config.BOOKING_QUEUE_BATCH_SIZE:
+                try:
+                    batch.append(shard.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                cls._process(batch)
+            except Exception as e:
+                for ticket in batch:
+                    if ticket.status == 'pending':
+                        cls._finish(ticket, {'success': False, 'message': f'订票失败: {str(e)}'})
+
+    @classmethod
+    def _process(cls, batch):
+        """
+        在一个事务中处理一批订票
+        业务校验失败只回滚到该请求的保存点；数据库错误（死锁等）或版本冲突会使整个事务失效，
+        此时回滚整批，逐个改用同步订票（带重试）处理
+        """
+        results = {}
+        touched = set()
+        # 缓存数据在取连接之前加载，事务中不再访问连接池
+        network, seat_maps = load_booking_context([ticket.booking for ticket in batch])
+        conn = db.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            conn.begin()
+            for ticket in batch:
+                cursor.execute("SAVEPOINT booking")
+                try:
+                    result, occupied = place_order(
+                        cursor, ticket.booking, network, seat_maps.get(ticket.booking.schedule_id)
+                    )
+                except (pymysql.err.Error, ConcurrentUpdateError):
+                    raise
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT booking")
+                    results[ticket.request_id] = {'success': False, 'message': f'订票失败: {str(e)}'}
+                    continue
+                cursor.execute("RELEASE SAVEPOINT booking")
+                # 同批后续请求自动选座时需要看到本批已占用的座位
+                SeatMapCache.mark_occupied(*occupied, seat_maps.get(occupied[0]))
+                touched.add(occupied[0])
+                results[ticket.request_id] = result
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # 位图中已标记了未提交的占用，丢弃后重新加载
+            for schedule_id in touched:
+                SeatMapCache.invalidate(schedule_id)
+            results = None
+        finally:
+            cursor.close()
+            conn.close()
+
+        for ticket in batch:
+            if results is None:
+                try:
+                    result = book(ticket.booking)
+                except Exception as e:
+                    result = {'success': False, 'message': f'订票失败: {str(e)}'}
+            else:
+                result = results[ticket.request_id]
+            cls._finish(ticket, result)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+进程内缓存
+提供带TTL过期、LRU容量限制和版本号失效的读穿透缓存
+"""
+import threading
+import time
+from collections import OrderedDict
+from app.config import Config
+
+
+class TTLCache:
+    """
+    带过期时间的读穿透缓存
+    每次失效都会递增版本号，加载期间发生失效时加载结果不会写入缓存，
+    避免把过时的数据重新放回缓存
+    条目可以附带标签（如班次ID），按标签批量失效
+    """
+
+    def __init__(self, ttl, max_size=None):
+        """
+        :param ttl: 缓存有效期（秒）
+        :param max_size: 最大条目数，超出时淘汰最久未使用的条目；None表示不限制
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.version = 0
+        self._data = OrderedDict()
+        self._tags = {}      # 标签 -> 缓存键集合
+        self._key_tags = {}  # 缓存键 -> 标签集合
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """获取缓存值，不存在或已过期时返回None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expire_at = entry
+            if time.time() >= expire_at:
+                self._remove(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, version=None, tags=()):
+        """
+        写入缓存
+        :param version: 加载开始时的版本号，与当前版本不一致时放弃写入
+        :param tags: 条目的标签，用于invalidate_tags批量失效
+        :return: 是否写入成功
+        """
+        with self._lock:
+            if version is not None and version != self.version:
+                return False
+            self._remove(key)
+            self._data[key] = (value, time.time() + self.ttl)
+            if tags:
+                self._key_tags[key] = set(tags)
+                for tag in tags:
+                    self._tags.setdefault(tag, set()).add(key)
+            if self.max_size is not None:
+                while len(self._data) > self.max_size:
+                    self._remove(next(iter(self._data)))
+            return True
+
+    def get_or_load(self, key, loader, tags_of=None):
+        """
+        读穿透：缓存未命中时调用loader加载并写入缓存
+        :param tags_of: 根据加载结果计算标签的函数
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        version = self.version
+        value = loader()
+        if value is not None:
+            self.set(key, value, version, tags_of(value) if tags_of else ())
+        return value
+
+    def invalidate(self, key=None):
+        """使缓存失效，key为空时清空全部"""
+        with self._lock:
+            self.version += 1
+            if key is None:
+                self._data.clear()
+                self._tags.clear()
+                self._key_tags.clear()
+            else:
+                self._remove(key)
+
+    def invalidate_tags(self, tags):
+        """使带有任一指定标签的条目失效"""
+        with self._lock:
+            self.version += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def _remove(self, key):
+        """删除条目及其标签索引（调用方需持有锁）"""
+        self._data.pop(key, None)
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def __len__(self):
+        return len(self._data)
+
+
+# 车站、城市等参考数据缓存（仅在管理员修改车站时失效）
+reference_cache = TTLCache(ttl=Config.REFERENCE_CACHE_TTL)
+
+# 班次查询结果缓存（只缓存班次静态信息，以班次ID为标签）
+search_cache = TTLCache(ttl=Config.SEARCH_CACHE_TTL, max_size=Config.SEARCH_CACHE_MAX_SIZE)
+
+# 不存在的用户名（小写）缓存，登录、找回密码等接口命中时不再查询 User 表；注册成功时失效
+missing_user_cache = TTLCache(ttl=Config.MISSING_USER_CACHE_TTL, max_size=Config.MISSING_USER_CACHE_MAX_SIZE)
@@ -24,10 +24,97 @@ class Config:
     POOL_BLOCKING = True       # 连接池满时是否阻塞等待
     POOL_MAX_USAGE = 0         # 连接最大使用次数（0表示无限制）
     POOL_RESET = True          # 连接归还池时是否重置状态
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Prometheus 采集连接池指标使用的令牌（可选）
+
+    # SQL 语句追踪
+    QUERY_TRACE_ENABLED = os.environ.get('QUERY_TRACE_ENABLED', '1') == '1'
+    SLOW_QUERY_MS = 200                  # 慢查询阈值（毫秒）
+    SLOW_QUERY_LOG_SIZE = 200            # 保留的慢查询条数
+    QUERY_STATS_MAX_FINGERPRINTS = 1000  # 最多统计的语句指纹数
+    N_PLUS_ONE_THRESHOLD = 10            # 同一语句在一个请求中执行达到该次数时记为疑似 N+1
+
+    # 请求采样分析（默认关闭）
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0)  # 采样比例 0~1
+    PROFILE_CPROFILE = os.environ.get('PROFILE_CPROFILE') == '1'  # 被采样的请求是否同时运行 cProfile
+    PROFILE_KEEP = 20             # 保留的 cProfile 结果数
+    PROFILE_TOP_FUNCTIONS = 30    # 每个 cProfile 结果输出的函数数
+
+    # 订票并发策略：pessimistic（SELECT ... FOR UPDATE 锁定座位）或 optimistic（库存版本号校验）
+    BOOKING_STRATEGY = os.environ.get('BOOKING_STRATEGY') or 'pessimistic'
+    OPTIMISTIC_MAX_RETRIES = 5  # 乐观订票版本冲突时的最大重试次数
+
+    # 订票处理方式：sync（请求内同步完成）或 queued（按班次分片排队，客户端轮询结果）
+    BOOKING_MODE = os.environ.get('BOOKING_MODE') or 'sync'
+    BOOKING_QUEUE_SHARDS = 4        # 分片数（工作线程数）
+    BOOKING_QUEUE_BATCH_SIZE = 20   # 每个事务最多处理的订票请求数
+    BOOKING_QUEUE_MAX_SIZE = 1000   # 每个分片最多排队的请求数
+    BOOKING_RESULT_TTL = 300        # 订票结果保留时间（秒）
+    BOOKING_POLL_MAX_WAIT = 30      # 长轮询最长等待时间（秒）
+
+    # 座位位图缓存配置
+    SEAT_MAP_TTL = 60              # 位图有效期（秒），限制多进程部署下的数据滞后
+    SEAT_MAP_MAX_SCHEDULES = 2000  # 最多缓存的班次数
+    AUTO_SEAT_MAX_ATTEMPTS = 3     # 自动选座遇到冲突时的最大重选次数
+
+    # 参考数据缓存配置（车站、城市）
+    REFERENCE_CACHE_TTL = 600  # 缓存有效期（秒）
+
+    # 班次查询结果缓存配置
+    SEARCH_CACHE_TTL = 300         # 缓存有效期（秒）
+    SEARCH_CACHE_MAX_SIZE = 5000   # 最多缓存的查询条件组合数
+
+    # 行程规划配置
+    JOURNEY_MIN_TRANSFER_MINUTES = 20  # 最短换乘时间（分钟）
+    JOURNEY_MAX_RESULTS = 50           # 最多返回的行程方案数
+
+    # 批量写入配置
+    BULK_CHUNK_SIZE = 500  # 每个事务提交的语句数
+
+    # 报表汇总配置
+    ROLLUP_SLOTS = 16  # 每天的汇总行拆分数（分散订票事务的行锁）
+
+    # 上座率报表配置
+    OCCUPANCY_DEFAULT_DAYS = 7  # 未指定日期范围时统计今天起的天数
+
+    # 列式内存分析配置（可选模块，安装 NumPy 后使用向量化计算）
+    ANALYTICS_ENABLED = os.environ.get('ANALYTICS_ENABLED') == '1'
+    ANALYTICS_REFRESH_INTERVAL = 30  # 增量刷新最小间隔（秒）
+    ANALYTICS_WATERMARK_LAG = 5      # 只追加创建时间早于该秒数之前的行
+    ANALYTICS_FETCH_SIZE = 10000     # 每次按水位读取的行数
+
+    # 报表导出配置
+    EXPORT_FETCH_SIZE = 1000   # 服务端游标每次读取的行数
+    EXPORT_FLUSH_ROWS = 500    # 每写入多少行向客户端输出一次
+
+    # 时刻表批量生成配置
+    TIMETABLE_MAX_DAYS = 366      # 单个模板最长日期范围（天）
+    TIMETABLE_MAX_ROWS = 100000   # 一次最多生成的班次数
 
     SESSION_TIMEOUT = 3600  # 1小时
 
+    # 密码哈希
+    BCRYPT_ROUNDS = 12               # bcrypt cost，调整后用户下次登录时自动按新 cost 重新计算
+    PASSWORD_HASH_WORKERS = 2        # 同时进行的哈希计算数
+    PASSWORD_HASH_MAX_PENDING = 32   # 排队（含计算中）的最大任务数，超过时直接拒绝
+    PASSWORD_HASH_TIMEOUT = 5        # 等待哈希结果的最长时间（秒）
+
+    # 认证接口限流（令牌桶），压测时可设置 AUTH_RATE_LIMIT_ENABLED=0 关闭
+    AUTH_RATE_LIMIT_ENABLED = os.environ.get('AUTH_RATE_LIMIT_ENABLED', '1') == '1'
+    AUTH_RATE_IP_BURST = int(os.environ.get('AUTH_RATE_IP_BURST') or 30)  # 每个 IP 允许的突发请求数
+    AUTH_RATE_IP_PER_SECOND = float(os.environ.get('AUTH_RATE_IP_PER_SECOND') or 0.5)  # 每个 IP 每秒补充的请求数
+    AUTH_RATE_USERNAME_BURST = int(os.environ.get('AUTH_RATE_USERNAME_BURST') or 5)  # 每个用户名允许的突发登录/找回密码次数
+    AUTH_RATE_USERNAME_PER_SECOND = float(os.environ.get('AUTH_RATE_USERNAME_PER_SECOND') or 0.1)  # 每个用户名每秒补充的次数
+    MISSING_USER_CACHE_TTL = 10          # 不存在的用户名缓存有效期（秒）
+    MISSING_USER_CACHE_MAX_SIZE = 10000  # 最多缓存的不存在用户名数
+    SESSION_WRITE_BEHIND = os.environ.get('SESSION_WRITE_BEHIND', '1') == '1'  # Session 表异步批量写入
+    SESSION_FLUSH_INTERVAL = 1     # 批量写入间隔（秒）
+    SESSION_WRITE_GRACE = 10       # 新会话在其他进程中尚未写入时的宽限时间（秒）
+    SESSION_CACHE_TTL = 60         # 缓存的会话回查 Session 表的间隔（秒）
+    SESSION_SWEEP_INTERVAL = 300   # 过期会话清理间隔（秒）
+    SESSION_SWEEP_BATCH = 1000     # 每批删除的过期会话数
+
     PER_PAGE = 20
+    MAX_PER_PAGE = 100
 
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
 
@@ -3,13 +3,20 @@
 数据库连接管理（使用连接池）
 """
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.cursors import DictCursor, SSDictCursor
 from contextlib import contextmanager
 from functools import wraps
 import time
 import random
 from dbutils.pooled_db import PooledDB
 from app.config import Config
+from app.pool_metrics import InstrumentedPool
+from app import query_trace
+
+
+class ConcurrentUpdateError(Exception):
+    """乐观并发控制检测到数据已被其他事务修改"""
+    pass
 
 
 class Database:
@@ -29,7 +36,7 @@ class Database:
         """
         if cls._pool is None:
             print("正在初始化数据库连接池...")
-            cls._pool = PooledDB(
+            pool = PooledDB(
                 creator=pymysql,         
                 maxconnections=Config.POOL_MAX_CONNECTIONS,  
                 mincached=Config.POOL_MIN_CACHED,           
@@ -49,6 +56,8 @@ class Database:
                 cursorclass=DictCursor,
                 autocommit=False
             )
+            # 包装监控埋点，记录取连接等待时间、使用中连接数和持有时间
+            cls._pool = InstrumentedPool(pool, Config.POOL_MAX_CONNECTIONS)
             print(f"数据库连接池初始化成功！配置：max={Config.POOL_MAX_CONNECTIONS}, min_cached={Config.POOL_MIN_CACHED}, max_cached={Config.POOL_MAX_CACHED}")
         return cls._pool
     
@@ -61,14 +70,44 @@ class Database:
             return "连接池未初始化"
         
         # DBUtils的PooledDB没有直接提供状态查询接口
-        # 这里返回配置信息
-        return {
+        # 配置信息之外的运行指标由 InstrumentedPool 埋点统计
+        status = {
             'max_connections': Config.POOL_MAX_CONNECTIONS,
             'min_cached': Config.POOL_MIN_CACHED,
             'max_cached': Config.POOL_MAX_CACHED,
             'max_shared': Config.POOL_MAX_SHARED,
             'status': '运行中'
         }
+        status.update(cls._pool.snapshot())
+        return status
+    
+    @classmethod
+    def get_pool_metrics(cls):
+        """连接池指标（Prometheus 文本格式）"""
+        if cls._pool is None:
+            return ''
+        return cls._pool.prometheus()
+    
+    @staticmethod
+    def add_query_hook(hook):
+        """
+        注册语句追踪钩子，连接池取出的连接每执行一条语句调用一次 hook(event)
+        event 包含 fingerprint、sql、param_count、rows、elapsed_ms、pool_wait_ms、endpoint
+        """
+        query_trace.add_hook(hook)
+    
+    @staticmethod
+    def remove_query_hook(hook):
+        query_trace.remove_hook(hook)
+    
+    @staticmethod
+    def get_query_stats(top=20):
+        """语句统计：耗时最多的语句指纹、按接口的语句数汇总、最近的慢查询"""
+        return query_trace.query_stats.summary(top)
+    
+    @staticmethod
+    def reset_query_stats():
+        query_trace.query_stats.reset()
     
     @staticmethod
     def retry_on_deadlock(max_retries=3, base_wait_time=0.01):
@@ -109,6 +148,28 @@ class Database:
             return wrapper
         return decorator
     
+    @staticmethod
+    def retry_on_conflict(max_retries=5):
+        """
+        乐观锁冲突重试装饰器
+        版本号校验失败说明读取的快照已过期，立即重新执行即可，不需要等待
+        :param max_retries: 最大重试次数，默认5次
+        :return: 装饰器函数
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                for attempt in range(max_retries):
+                    try:
+                        return func(*args, **kwargs)
+                    except ConcurrentUpdateError:
+                        if attempt < max_retries - 1:
+                            continue
+                        raise Exception('系统繁忙，请稍后重试（并发冲突）')
+                return None
+            return wrapper
+        return decorator
+    
     @classmethod
     def get_connection(cls):
         """
@@ -164,13 +225,87 @@ class Database:
             cursor.execute(sql, params or ())
             return cursor.lastrowid
     
+    @staticmethod
+    def stream_query(sql, params=None, fetch_size=1000):
+        """
+        使用服务端游标（SSDictCursor）逐批读取查询结果
+        结果不会一次性加载到内存，适合导出大量数据；
+        生成器结束或被关闭时归还连接，读取期间连接被独占，应尽快消费完毕
+        """
+        conn = Database.get_connection()
+        cursor = conn.cursor(SSDictCursor)
+        try:
+            cursor.execute(sql, params or ())
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+            conn.close()
+    
+    @staticmethod
+    def _group_statements(sql_list):
+        """
+        把相邻的相同SQL合并为一组，便于用 executemany 一次发送
+        只合并相邻语句，保持原有执行顺序
+        :return: [(sql, [params, ...]), ...]
+        """
+        groups = []
+        for sql, params in sql_list:
+            if groups and groups[-1][0] == sql:
+                groups[-1][1].append(params or ())
+            else:
+                groups.append((sql, [params or ()]))
+        return groups
+    
     @staticmethod
     def execute_batch(sql_list):
-
+        """在一个事务中执行一组语句（全部成功或全部回滚）"""
         with Database.get_cursor(commit=True) as cursor:
-            for sql, params in sql_list:
-                cursor.execute(sql, params or ())
+            for sql, params_list in Database._group_statements(sql_list):
+                cursor.executemany(sql, params_list)
             return True
+    
+    @staticmethod
+    def execute_bulk(sql_list, chunk_size=None):
+        """
+        分块批量写入
+        每 chunk_size 条语句提交一次，相邻的相同语句合并为 executemany（多行 INSERT 会被合并为一条语句），
+        避免一个大事务长时间持有行锁；每个分块遇到死锁时单独重试
+        注意：分块之间不是原子的，某个分块失败时之前的分块已经提交
+        :param sql_list: [(sql, params), ...]
+        :param chunk_size: 每个事务包含的语句数，默认 Config.BULK_CHUNK_SIZE
+        :return: {'statements', 'affected', 'elapsed_ms', 'chunks': [{'statements', 'affected', 'elapsed_ms'}, ...]}
+        """
+        chunk_size = chunk_size or Config.BULK_CHUNK_SIZE
+        sql_list = list(sql_list)
+        
+        @Database.retry_on_deadlock(max_retries=3)
+        def _write_chunk(chunk):
+            start = time.perf_counter()
+            affected = 0
+            with Database.get_cursor(commit=True) as cursor:
+                for sql, params_list in Database._group_statements(chunk):
+                    affected += cursor.executemany(sql, params_list) or 0
+            return {
+                'statements': len(chunk),
+                'affected': affected,
+                'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+            }
+        
+        start = time.perf_counter()
+        chunks = [
+            _write_chunk(sql_list[offset:offset + chunk_size])
+            for offset in range(0, len(sql_list), chunk_size)
+        ]
+        return {
+            'statements': len(sql_list),
+            'affected': sum(chunk['affected'] for chunk in chunks),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+            'chunks': chunks
+        }
 
 
 # 数据库实例
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+班次余票库存管理
+Schedule_Inventory 表冗余保存每个班次的已售座位数（任一区段被占用的座位），
+查询余票时直接读取计数，不再对 Ticket 表做关联 COUNT(*)
+"""
+import pymysql
+from app.database import db, ConcurrentUpdateError
+
+
+class Inventory:
+    """
+    班次库存计数（增减操作在调用方的事务内执行）
+    每次座位占用发生变化都会递增 version，乐观订票据此判断读取的快照是否已过期
+    """
+
+    @staticmethod
+    def increase_sold(cursor, schedule_id, count):
+        """
+        订票成功后增加已售座位数
+        库存行不存在时自动创建，保证新增班次无需额外初始化
+        """
+        cursor.execute(
+            """INSERT INTO Schedule_Inventory (schedule_id, sold_seats, version)
+               VALUES (%s, %s, 1)
+               ON DUPLICATE KEY UPDATE sold_seats = sold_seats + VALUES(sold_seats), version = version + 1""",
+            (schedule_id, count)
+        )
+
+    @staticmethod
+    def read_version(cursor, schedule_id):
+        """读取班次库存版本号（不加锁），库存行不存在时返回None"""
+        cursor.execute(
+            "SELECT version FROM Schedule_Inventory WHERE schedule_id = %s",
+            (schedule_id,)
+        )
+        row = cursor.fetchone()
+        return row['version'] if row else None
+
+    @staticmethod
+    def claim(cursor, schedule_id, version, count):
+        """
+        乐观订票的提交点：仅当版本号仍等于读取时的值才增加已售座位数
+        :raises ConcurrentUpdateError: 版本号已变化或库存行已被其他事务创建
+        """
+        if version is None:
+            try:
+                cursor.execute(
+                    """INSERT INTO Schedule_Inventory (schedule_id, sold_seats, version)
+                       VALUES (%s, %s, 1)""",
+                    (schedule_id, count)
+                )
+            except pymysql.err.IntegrityError as e:
+                if e.args[0] == 1062:
+                    raise ConcurrentUpdateError()
+                raise
+            return
+
+        affected = cursor.execute(
+            """UPDATE Schedule_Inventory
+               SET sold_seats = sold_seats + %s, version = version + 1
+               WHERE schedule_id = %s AND version = %s""",
+            (count, schedule_id, version)
+        )
+        if affected == 0:
+            raise ConcurrentUpdateError()
+
+    @staticmethod
+    def decrease_sold(cursor, schedule_counts):
+        """
+        退票成功后减少已售座位数
+        :param schedule_counts: {schedule_id: 释放的座位数}
+        """
+        for schedule_id, count in schedule_counts.items():
+            cursor.execute(
+                """UPDATE Schedule_Inventory
+                   SET sold_seats = GREATEST(sold_seats - %s, 0), version = version + 1
+                   WHERE schedule_id = %s""",
+                (count, schedule_id)
+            )
+
+    @staticmethod
+    def reconcile(schedule_id=None):
+        """
+        根据有效车票重建座位区段占用和已售座位数，修正计数漂移
+        :param schedule_id: 指定班次ID，为空时校准全部班次
+        :return: 受影响的行数
+        """
+        params = [schedule_id] if schedule_id else []
+        ticket_condition = " AND schedule_id = %s" if schedule_id else ""
+        schedule_condition = " WHERE s.schedule_id = %s" if schedule_id else ""
+
+        with db.get_cursor(commit=True) as cursor:
+            cursor.execute(
+                "DELETE FROM Seat_Occupancy WHERE 1=1" + ticket_condition,
+                params
+            )
+            cursor.execute(
+                """INSERT INTO Seat_Occupancy (schedule_id, seat_id, segment_mask)
+                   SELECT schedule_id, seat_id, BIT_OR(segment_mask)
+                   FROM Ticket
+                   WHERE status = 'valid'""" + ticket_condition + """
+                   GROUP BY schedule_id, seat_id""",
+                params
+            )
+            return cursor.execute(
+                """INSERT INTO Schedule_Inventory (schedule_id, sold_seats)
+                   SELECT s.schedule_id, COUNT(o.seat_id)
+                   FROM Schedule s
+                   LEFT JOIN Seat_Occupancy o ON o.schedule_id = s.schedule_id""" + schedule_condition + """
+                   GROUP BY s.schedule_id
+                   ON DUPLICATE KEY UPDATE sold_seats = VALUES(sold_seats), version = version + 1""",
+                params
+            )
+
+
+class SeatOccupancy:
+    """
+    座位区段占用
+    每个 (班次, 座位) 一行，segment_mask 的第i位表示第i站到第i+1站的区段已售，
+    区段是否冲突只需一次位与运算
+    segment_mask 为 BIGINT UNSIGNED，线路最多 MAX_SEGMENTS 个区段（MAX_SEGMENTS + 1 个经停站）
+    """
+
+    MAX_SEGMENTS = 64
+
+    @staticmethod
+    def lock(cursor, schedule_id, seat_ids, for_update=True):
+        """
+        读取座位占用情况
+        :param for_update: 为True时锁定这些行（悲观锁，持有到事务结束）；乐观订票时只读取快照
+        :return: {seat_id: 已占用区段位掩码}，没有占用记录的座位不在结果中
+        """
+        placeholders = ','.join(['%s'] * len(seat_ids))
+        cursor.execute(
+            f"""SELECT seat_id, segment_mask FROM Seat_Occupancy
+                WHERE schedule_id = %s AND seat_id IN ({placeholders})""" + (" FOR UPDATE" if for_update else ""),
+            [schedule_id] + list(seat_ids)
+        )
+        return {row['seat_id']: int(row['segment_mask']) for row in cursor.fetchall()}
+
+    @staticmethod
+    def occupy(cursor, schedule_id, seat_ids, segment_mask):
+        """
+        把座位的指定区段标记为已占用
+        先为首次售出的座位插入空行，再用条件 UPDATE 写入区段：只有与已占用区段不重叠的行会被更新，
+        更新行数不足说明有座位的该区段已被其他订单占用（如并发首次售出同一座位），
+        由数据库保证同一座位的同一区段不会被重复售出
+        :return: 全部座位是否占用成功，返回 False 时调用方需要回滚
+        """
+        values = ','.join(['(%s, %s, 0)'] * len(seat_ids))
+        params = []
+        for seat_id in seat_ids:
+            params.extend([schedule_id, seat_id])
+        cursor.execute(
+            f"INSERT IGNORE INTO Seat_Occupancy (schedule_id, seat_id, segment_mask) VALUES {values}",
+            params
+        )
+
+        placeholders = ','.join(['%s'] * len(seat_ids))
+        updated = cursor.execute(
+            f"""UPDATE Seat_Occupancy SET segment_mask = segment_mask | %s
+                WHERE schedule_id = %s AND seat_id IN ({placeholders}) AND segment_mask & %s = 0""",
+            [segment_mask, schedule_id] + list(seat_ids) + [segment_mask]
+        )
+        return updated == len(seat_ids)
+
+    @staticmethod
+    def release(cursor, schedule_id, seat_masks):
+        """
+        释放座位的区段占用
+        :param seat_masks: {seat_id: 要释放的区段位掩码}
+        :return: 释放后完全空闲的座位数
+        """
+        occupied = SeatOccupancy.lock(cursor, schedule_id, list(seat_masks))
+        freed = 0
+        params = []
+        for seat_id, segment_mask in seat_masks.items():
+            current = occupied.get(seat_id, 0)
+            remaining = current & ~segment_mask
+            params.extend([schedule_id, seat_id, remaining])
+            if current and not remaining:
+                freed += 1
+        # 座位行已锁定，用一条多行语句写回剩余的占用区段
+        values = ','.join(['(%s, %s, %s)'] * len(seat_masks))
+        cursor.execute(
+            f"""INSERT INTO Seat_Occupancy (schedule_id, seat_id, segment_mask)
+                VALUES {values}
+                ON DUPLICATE KEY UPDATE segment_mask = VALUES(segment_mask)""",
+            params
+        )
+        return freed
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+多段行程规划
+根据 Route_Station 中的经停站，在内存中构建线路网络，
+支持中途站上下车的直达方案和一次换乘方案
+"""
+from app.cache import reference_cache
+from app.config import Config
+from app.database import db
+
+
+class RouteInfo:
+    """线路及其经停站（按 order_no 排序）"""
+
+    __slots__ = ('route_id', 'route_name', 'route_type', 'total_distance', 'stops', 'positions')
+
+    def __init__(self, route, stops):
+        self.route_id = route['route_id']
+        self.route_name = route['route_name']
+        self.route_type = route['route_type']
+        self.total_distance = float(route['total_distance'] or 0)
+        # stops: [(station_id, distance_from_start, estimated_minutes), ...]
+        self.stops = stops
+        self.positions = {station_id: index for index, (station_id, _, _) in enumerate(stops)}
+
+    def segment_mask(self, board, alight):
+        """区间 [board, alight) 对应的区段位掩码（第i位表示第i站到第i+1站的区段）"""
+        return (1 << alight) - (1 << board)
+
+    def full_mask(self):
+        """全程区段位掩码"""
+        return self.segment_mask(0, len(self.stops) - 1)
+
+    def segment_price(self, base_price, board, alight):
+        """按里程比例计算区段票价，缺少里程数据时按全程票价"""
+        distance = self.segment_distance(board, alight)
+        if distance is not None and self.total_distance > 0:
+            return round(base_price * distance / self.total_distance, 2)
+        return base_price
+
+    def locate(self, from_station_id=None, to_station_id=None):
+        """
+        把上下车站转换为站序下标，缺省为全程
+        :return: (上车站下标, 下车站下标)，车站不在线路上或顺序不正确时返回None
+        """
+        board = 0 if from_station_id is None else self.positions.get(from_station_id)
+        alight = len(self.stops) - 1 if to_station_id is None else self.positions.get(to_station_id)
+        if board is None or alight is None or board >= alight:
+            return None
+        return board, alight
+
+    def segment_distance(self, board, alight):
+        start, end = self.stops[board][1], self.stops[alight][1]
+        if start is None or end is None:
+            return None
+        return end - start
+
+    def stop_offset(self, index, duration):
+        """
+        到达第index个经停站相对发车时间的分钟数
+        未维护预计分钟数时，按里程比例估算；终点站使用班次的实际运行时长
+        """
+        if index == 0:
+            return 0
+        if index == len(self.stops) - 1:
+            return duration
+        minutes = self.stops[index][2]
+        if minutes is not None:
+            return minutes
+        distance = self.stops[index][1]
+        if distance is not None and self.total_distance > 0:
+            return int(duration * distance / self.total_distance)
+        return None
+
+
+class RouteNetwork:
+    """线路网络：车站 -> 经过该站的 (线路ID, 站序下标)"""
+
+    def __init__(self, routes, route_stations, stations):
+        self.stations = {station['station_id']: station for station in stations}
+
+        stops_by_route = {}
+        for row in route_stations:
+            stops_by_route.setdefault(row['route_id'], []).append((
+                row['station_id'],
+                float(row['distance_from_start']) if row['distance_from_start'] is not None else None,
+                row['estimated_minutes']
+            ))
+
+        self.routes = {}
+        self.station_routes = {}
+        for route in routes:
+            stops = stops_by_route.get(route['route_id'])
+            if not stops:
+                # 未维护经停站的线路只包含起点和终点
+                stops = [
+                    (route['start_station_id'], 0.0, 0),
+                    (route['end_station_id'], float(route['total_distance'] or 0), None)
+                ]
+            info = RouteInfo(route, stops)
+            self.routes[info.route_id] = info
+            for index, (station_id, _, _) in enumerate(stops):
+                self.station_routes.setdefault(station_id, []).append((info.route_id, index))
+
+    def direct_legs(self, origin_ids, dest_ids):
+        """
+        直达方案：同一线路上先经过出发站、后经过到达站
+        :return: [(route_id, 上车站下标, 下车站下标), ...]
+        """
+        legs = []
+        for origin in origin_ids:
+            for route_id, board in self.station_routes.get(origin, ()):
+                positions = self.routes[route_id].positions
+                for dest in dest_ids:
+                    alight = positions.get(dest)
+                    if alight is not None and alight > board:
+                        legs.append((route_id, board, alight))
+        return legs
+
+    def transfer_legs(self, origin_ids, dest_ids):
+        """
+        一次换乘方案
+        先求出所有能到达目的站的 (线路, 上车下标, 下车下标)，按上车站建立索引，
+        再沿出发线路向后遍历经停站查找换乘点
+        :return: [((route_a, board_a, alight_a), (route_b, board_b, alight_b)), ...]
+        """
+        reach_dest = {}
+        for dest in dest_ids:
+            for route_id, alight in self.station_routes.get(dest, ()):
+                stops = self.routes[route_id].stops
+                for board in range(alight):
+                    reach_dest.setdefault(stops[board][0], []).append((route_id, board, alight))
+
+        plans = []
+        for origin in origin_ids:
+            for route_a, board_a in self.station_routes.get(origin, ()):
+                stops = self.routes[route_a].stops
+                for alight_a in range(board_a + 1, len(stops)):
+                    transfer_station = stops[alight_a][0]
+                    if transfer_station in dest_ids or transfer_station in origin_ids:
+                        continue
+                    for leg_b in reach_dest.get(transfer_station, ()):
+                        if leg_b[0] != route_a:
+                            plans.append(((route_a, board_a, alight_a), leg_b))
+        return plans
+
+
+def _load_route_network():
+    routes = db.execute_query(
+        "SELECT route_id, route_name, route_type, start_station_id, end_station_id, total_distance FROM Route"
+    )
+    route_stations = db.execute_query(
+        """SELECT route_id, station_id, order_no, distance_from_start, estimated_minutes
+           FROM Route_Station
+           ORDER BY route_id, order_no"""
+    )
+    stations = db.execute_query("SELECT station_id, station_name, city FROM Station")
+    return RouteNetwork(routes, route_stations, stations)
+
+
+def get_route_network():
+    """获取线路网络（随参考数据缓存一起失效）"""
+    return reference_cache.get_or_load('route_network', _load_route_network)
+
+
+def _minutes(value):
+    """TIME字段（timedelta）转换为分钟数"""
+    return int(value.total_seconds() // 60)
+
+
+def _format_minutes(minutes):
+    """分钟数格式化为 HH:MM，跨天时追加 +N"""
+    days, minutes = divmod(minutes, 24 * 60)
+    text = f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return f"{text}+{days}" if days else text
+
+
+class JourneyPlanner:
+    """结合班次数据生成具体行程"""
+
+    def __init__(self, network, departure_date):
+        self.network = network
+        self.departure_date = departure_date
+        self._schedules = {}
+
+    def _load_schedules(self, route_ids):
+        """一次查询取出当天相关线路的所有班次"""
+        route_ids = [route_id for route_id in route_ids if route_id not in self._schedules]
+        if not route_ids:
+            return
+        for route_id in route_ids:
+            self._schedules[route_id] = []
+        placeholders = ','.join(['%s'] * len(route_ids))
+        rows = db.execute_query(
+            f"""SELECT schedule_id, schedule_no, route_id, departure_time, arrival_time, base_price, status
+                FROM Schedule
+                WHERE departure_date = %s AND route_id IN ({placeholders}) AND status != 'cancelled'
+                ORDER BY departure_time""",
+            [self.departure_date] + route_ids
+        )
+        for row in rows:
+            self._schedules[row['route_id']].append(row)
+
+    def _leg(self, schedule, route_id, board, alight):
+        """生成单段行程，无法确定经停时间时返回None"""
+        route = self.network.routes[route_id]
+        start = _minutes(schedule['departure_time'])
+        duration = _minutes(schedule['arrival_time']) - start
+        if duration <= 0:
+            duration += 24 * 60
+        board_offset = route.stop_offset(board, duration)
+        alight_offset = route.stop_offset(alight, duration)
+        if board_offset is None or alight_offset is None:
+            return None
+
+        distance = route.segment_distance(board, alight)
+        price = route.segment_price(float(schedule['base_price']), board, alight)
+
+        from_station = self.network.stations.get(route.stops[board][0], {})
+        to_station = self.network.stations.get(route.stops[alight][0], {})
+        return {
+            'schedule_id': schedule['schedule_id'],
+            'schedule_no': schedule['schedule_no'],
+            'route_name': route.route_name,
+            'route_type': route.route_type,
+            'status': schedule['status'],
+            'from_station_id': route.stops[board][0],
+            'from_station': from_station.get('station_name'),
+            'from_city': from_station.get('city'),
+            'to_station_id': route.stops[alight][0],
+            'to_station': to_station.get('station_name'),
+            'to_city': to_station.get('city'),
+            'departure_minutes': start + board_offset,
+            'arrival_minutes': start + alight_offset,
+            'distance': distance,
+            'price': price
+        }
+
+    def _legs(self, route_id, board, alight):
+        legs = []
+        for schedule in self._schedules.get(route_id, ()):
+            leg = self._leg(schedule, route_id, board, alight)
+            if leg is not None:
+                legs.append(leg)
+        return legs
+
+    def plan(self, origin_ids, dest_ids, with_transfer=True):
+        """
+        规划行程
+        :return: 按到达时间排序的行程列表
+        """
+        direct = self.network.direct_legs(origin_ids, dest_ids)
+        transfers = self.network.transfer_legs(origin_ids, dest_ids) if with_transfer else []
+
+        route_ids = {leg[0] for leg in direct}
+        for leg_a, leg_b in transfers:
+            route_ids.add(leg_a[0])
+            route_ids.add(leg_b[0])
+        self._load_schedules(list(route_ids))
+
+        itineraries = []
+        for route_id, board, alight in direct:
+            for leg in self._legs(route_id, board, alight):
+                itineraries.append(self._itinerary([leg]))
+
+        min_transfer = Config.JOURNEY_MIN_TRANSFER_MINUTES
+        for leg_a, leg_b in transfers:
+            second_legs = self._legs(*leg_b)
+            if not second_legs:
+                continue
+            for first in self._legs(*leg_a):
+                # 对每个第一程班次，选择最早可衔接的第二程班次
+                ready = first['arrival_minutes'] + min_transfer
+                for second in second_legs:
+                    if second['departure_minutes'] >= ready:
+                        itineraries.append(self._itinerary([first, second]))
+                        break
+
+        itineraries.sort(key=lambda item: (item['arrival_minutes'], item['total_minutes']))
+        for itinerary in itineraries:
+            itinerary.pop('arrival_minutes')
+            for leg in itinerary['legs']:
+                leg['departure_time'] = _format_minutes(leg.pop('departure_minutes'))
+                leg['arrival_time'] = _format_minutes(leg.pop('arrival_minutes'))
+        return itineraries[:Config.JOURNEY_MAX_RESULTS]
+
+    @staticmethod
+    def _itinerary(legs):
+        departure = legs[0]['departure_minutes']
+        arrival = legs[-1]['arrival_minutes']
+        return {
+            'legs': [dict(leg) for leg in legs],
+            'transfer_count': len(legs) - 1,
+            'transfer_station': legs[0]['to_station'] if len(legs) > 1 else None,
+            'total_minutes': arrival - departure,
+            'total_price': round(sum(leg['price'] for leg in legs), 2),
+            'arrival_minutes': arrival
+        }
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+上座率报表
+已售座位数直接读取订票/退票事务维护的 Schedule_Inventory.sold_seats，
+只需关联 Schedule 和 Vehicle，不再对 Ticket、Seat 做关联统计
+"""
+from app.database import db
+from app.sales_rollup import range_condition
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(sorted_values, p):
+    """最近秩法百分位数（sorted_values 已升序排列）"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def _load_schedules(start, end, route_id=None):
+    """按发车日期半开区间读取班次的座位数和已售座位数（走 idx_date_route 范围扫描）"""
+    where, params = range_condition('s.departure_date', start, end)
+    if route_id:
+        where += " AND s.route_id = %s"
+        params.append(route_id)
+    rows = db.execute_query(
+        f"""SELECT s.schedule_id, s.schedule_no, s.departure_date, s.departure_time, s.status,
+                   r.route_id, r.route_name, v.seat_count,
+                   COALESCE(inv.sold_seats, 0) AS sold_seats
+            FROM Schedule s
+            JOIN Route r ON s.route_id = r.route_id
+            JOIN Vehicle v ON s.vehicle_id = v.vehicle_id
+            LEFT JOIN Schedule_Inventory inv ON inv.schedule_id = s.schedule_id
+            WHERE {where} AND s.status != 'cancelled'
+            ORDER BY s.departure_date, s.departure_time""",
+        params
+    )
+    for row in rows:
+        row['occupancy'] = round(row['sold_seats'] / row['seat_count'], 4) if row['seat_count'] else 0
+    return rows
+
+
+def _summarize(rows):
+    """汇总一组班次：总座位数、已售座位数、整体上座率和各班次上座率的分布"""
+    seats = sum(row['seat_count'] for row in rows)
+    sold = sum(row['sold_seats'] for row in rows)
+    rates = sorted(row['occupancy'] for row in rows)
+    summary = {
+        'schedule_count': len(rows),
+        'total_seats': seats,
+        'sold_seats': sold,
+        'occupancy': round(sold / seats, 4) if seats else 0,
+        'max_occupancy': rates[-1] if rates else None
+    }
+    for p in PERCENTILES:
+        summary[f'p{p}_occupancy'] = percentile(rates, p)
+    return summary
+
+
+def occupancy_report(start, end, route_id=None, group_by='route'):
+    """
+    上座率报表
+    :param start: 发车日期下限（包含）
+    :param end: 发车日期上限（不包含）
+    :param group_by: schedule（逐班次）/ route（按线路）/ day（按发车日期）
+    :return: (分组结果列表, 整体汇总)
+    """
+    rows = _load_schedules(start, end, route_id)
+
+    if group_by == 'schedule':
+        report = []
+        for row in rows:
+            report.append({
+                'schedule_id': row['schedule_id'],
+                'schedule_no': row['schedule_no'],
+                'route_name': row['route_name'],
+                'departure_date': row['departure_date'].strftime('%Y-%m-%d'),
+                'departure_time': str(row['departure_time']),
+                'status': row['status'],
+                'total_seats': row['seat_count'],
+                'sold_seats': row['sold_seats'],
+                'available_seats': max(row['seat_count'] - row['sold_seats'], 0),
+                'occupancy': row['occupancy']
+            })
+        report.sort(key=lambda item: item['occupancy'], reverse=True)
+        return report, _summarize(rows)
+
+    groups = {}
+    for row in rows:
+        if group_by == 'day':
+            key = row['departure_date'].strftime('%Y-%m-%d')
+        else:
+            key = (row['route_id'], row['route_name'])
+        groups.setdefault(key, []).append(row)
+
+    report = []
+    for key, group_rows in groups.items():
+        label = {'departure_date': key} if group_by == 'day' else {'route_id': key[0], 'route_name': key[1]}
+        report.append(dict(label, **_summarize(group_rows)))
+    if group_by == 'day':
+        report.sort(key=lambda item: item['departure_date'])
+    else:
+        report.sort(key=lambda item: item['occupancy'], reverse=True)
+    return report, _summarize(rows)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+密码哈希
+bcrypt 每次计算占用约 250ms CPU（cost=12），在请求线程中直接计算时，
+集中登录会占满工作线程，影响同一进程内的订票接口。这里把计算交给固定大小的线程池：
+    - 同时计算的数量不超过 PASSWORD_HASH_WORKERS
+    - 排队（含计算中）的任务超过 PASSWORD_HASH_MAX_PENDING 时直接拒绝，不再排队等待
+    - 登录成功时，如果已保存的哈希 cost 与 BCRYPT_ROUNDS 不同，用新 cost 重新计算并保存
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import bcrypt
+from app.config import Config
+
+
+class HasherBusyError(Exception):
+    """哈希任务过多，拒绝新的请求"""
+    pass
+
+
+class PasswordHasher:
+    """bcrypt 计算线程池（进程内单例）"""
+
+    _executor = None
+    _lock = threading.Lock()
+    _pending = 0      # 已提交尚未完成的任务数（排队 + 计算中）
+    _running = 0
+    _max_pending = 0
+    _completed = 0
+    _rejected = 0
+    _total_ms = 0.0
+
+    @classmethod
+    def _submit(cls, func):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash'
+                )
+            if cls._pending >= Config.PASSWORD_HASH_MAX_PENDING:
+                cls._rejected += 1
+                raise HasherBusyError('系统繁忙，请稍后重试')
+            cls._pending += 1
+            cls._max_pending = max(cls._max_pending, cls._pending)
+        try:
+            future = cls._executor.submit(cls._run, func)
+        except Exception:
+            with cls._lock:
+                cls._pending -= 1
+            raise
+        try:
+            return future.result(timeout=Config.PASSWORD_HASH_TIMEOUT)
+        except FutureTimeoutError:
+            # 任务仍会在线程池中完成，这里只是不再等待
+            raise HasherBusyError('系统繁忙，请稍后重试')
+
+    @classmethod
+    def _run(cls, func):
+        start = time.perf_counter()
+        with cls._lock:
+            cls._running += 1
+        try:
+            return func()
+        finally:
+            with cls._lock:
+                cls._running -= 1
+                cls._pending -= 1
+                cls._completed += 1
+                cls._total_ms += (time.perf_counter() - start) * 1000
+
+    @classmethod
+    def hash(cls, password):
+        """计算密码哈希（使用当前配置的 BCRYPT_ROUNDS）"""
+        return cls._submit(
+            lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(Config.BCRYPT_ROUNDS)).decode('utf-8')
+        )
+
+    @classmethod
+    def verify(cls, password, hashed):
+        """
+        校验密码
+        已保存的值不是有效的 bcrypt 哈希时抛出 ValueError
+        """
+        return cls._submit(lambda: bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8')))
+
+    @staticmethod
+    def needs_rehash(hashed):
+        """已保存哈希的 cost 与当前配置不同时需要重新计算（格式：$2b$12$...）"""
+        parts = hashed.split('$')
+        if len(parts) < 4 or not parts[2].isdigit():
+            return False
+        return int(parts[2]) != Config.BCRYPT_ROUNDS
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            return {
+                'workers': Config.PASSWORD_HASH_WORKERS,
+                'rounds': Config.BCRYPT_ROUNDS,
+                'pending': cls._pending,
+                'queued': cls._pending - cls._running,
+                'running': cls._running,
+                'max_pending': cls._max_pending,
+                'pending_limit': Config.PASSWORD_HASH_MAX_PENDING,
+                'completed': cls._completed,
+                'rejected': cls._rejected,
+                'avg_ms': round(cls._total_ms / cls._completed, 2) if cls._completed else None
+            }
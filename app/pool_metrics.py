@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+连接池监控
+PooledDB 没有提供状态查询接口，这里在取连接/归还连接处埋点，记录：
+    - 取连接等待时间直方图、当前等待取连接的线程数
+    - 使用中/空闲连接数、连接存活时间
+    - 按接口（Flask endpoint）统计的连接持有时间
+"""
+import threading
+import time
+import weakref
+from app.query_trace import TracedCursor, endpoint_label
+
+# 直方图桶上限（毫秒）
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _escape_label(value):
+    """Prometheus 标签值转义（反斜杠、双引号、换行）"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """累计直方图（调用方负责加锁）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """[(桶上限, 累计次数), ...]，最后一项上限为 '+Inf'"""
+        total = 0
+        result = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """按桶估算分位数（返回桶上限）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        for bound, total in self.cumulative():
+            if total >= target:
+                return round(self.max if bound == '+Inf' else min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.sum / self.count, 3) if self.count else None,
+            'p50_ms': self.quantile(0.5),
+            'p99_ms': self.quantile(0.99),
+            'max_ms': round(self.max, 3),
+            'buckets': [{'le': bound, 'count': total} for bound, total in self.cumulative()]
+        }
+
+
+class _TrackedConnection:
+    """包装池中取出的连接，关闭（归还）时记录持有时间，游标带语句计时"""
+
+    def __init__(self, pool, conn, endpoint, wait_ms=0.0):
+        self._pool = pool
+        self._conn = conn
+        self._endpoint = endpoint
+        self._wait_ms = wait_ms
+        self._checked_out = time.perf_counter()
+        self._closed = False
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._conn.close()
+        finally:
+            self._pool._checkin(self._endpoint, (time.perf_counter() - self._checked_out) * 1000)
+
+    def cursor(self, *args, **kwargs):
+        return TracedCursor(self._conn.cursor(*args, **kwargs), self._wait_ms)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class InstrumentedPool:
+    """带监控埋点的连接池包装"""
+
+    def __init__(self, pool, max_connections):
+        self._pool = pool
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.max_waiting = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.checkouts = 0
+        self.checkout_errors = 0
+        self.wait_histogram = Histogram()
+        self.hold_histogram = Histogram()
+        self.endpoint_hold = {}   # endpoint -> Histogram
+        # 底层物理连接 -> 首次取出时间，用于估算连接存活时间
+        self._born = weakref.WeakKeyDictionary()
+
+    def connection(self):
+        endpoint = endpoint_label()
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        start = time.perf_counter()
+        try:
+            conn = self._pool.connection()
+        except Exception:
+            with self._lock:
+                self.waiting -= 1
+                self.checkout_errors += 1
+            raise
+        wait_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.checkouts += 1
+            self.wait_histogram.observe(wait_ms)
+            raw = getattr(conn, '_con', None)
+            if raw is not None:
+                try:
+                    self._born.setdefault(raw, time.time())
+                except TypeError:
+                    pass
+        return _TrackedConnection(self, conn, endpoint, wait_ms)
+
+    def _checkin(self, endpoint, hold_ms):
+        with self._lock:
+            self.in_use -= 1
+            self.hold_histogram.observe(hold_ms)
+            histogram = self.endpoint_hold.get(endpoint)
+            if histogram is None:
+                histogram = self.endpoint_hold[endpoint] = Histogram()
+            histogram.observe(hold_ms)
+
+    def idle_count(self):
+        """池中空闲连接数（读取 PooledDB 内部的空闲缓存）"""
+        idle = getattr(self._pool, '_idle_cache', None)
+        return len(idle) if idle is not None else None
+
+    def connection_ages(self):
+        now = time.time()
+        with self._lock:
+            ages = sorted(now - born for born in self._born.values())
+        if not ages:
+            return {'tracked': 0}
+        return {
+            'tracked': len(ages),
+            'min_seconds': round(ages[0], 1),
+            'max_seconds': round(ages[-1], 1),
+            'avg_seconds': round(sum(ages) / len(ages), 1)
+        }
+
+    def snapshot(self):
+        idle = self.idle_count()
+        with self._lock:
+            status = {
+                'in_use': self.in_use,
+                'idle': idle,
+                'max_connections': self.max_connections,
+                'saturation': round(self.in_use / self.max_connections, 3) if self.max_connections else None,
+                'waiting': self.waiting,
+                'max_waiting': self.max_waiting,
+                'max_in_use': self.max_in_use,
+                'checkouts': self.checkouts,
+                'checkout_errors': self.checkout_errors,
+                'checkout_wait': self.wait_histogram.to_dict(),
+                'hold_time': self.hold_histogram.to_dict(),
+                'endpoints': {
+                    endpoint: {
+                        'count': histogram.count,
+                        'avg_ms': round(histogram.sum / histogram.count, 3),
+                        'p99_ms': histogram.quantile(0.99),
+                        'max_ms': round(histogram.max, 3)
+                    }
+                    for endpoint, histogram in sorted(self.endpoint_hold.items())
+                }
+            }
+        status['connection_age'] = self.connection_ages()
+        return status
+
+    def prometheus(self):
+        """Prometheus 文本格式（exposition format 0.0.4）"""
+        idle = self.idle_count()
+        lines = []
+
+        def gauge(name, help_text, value):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+
+        def histogram(name, hist, labels=''):
+            # 内部以毫秒记录，导出时按 Prometheus 惯例换算为秒
+            for bound, total in hist.cumulative():
+                le = bound if bound == '+Inf' else float(bound) / 1000
+                lines.append(f'{name}_bucket{{{labels}le="{le}"}} {total}')
+            suffix = f'{{{labels.rstrip(",")}}}' if labels else ''
+            lines.append(f'{name}_sum{suffix} {hist.sum / 1000}')
+            lines.append(f'{name}_count{suffix} {hist.count}')
+
+        with self._lock:
+            gauge('db_pool_connections_in_use', 'Connections currently checked out', self.in_use)
+            if idle is not None:
+                gauge('db_pool_connections_idle', 'Idle connections cached in the pool', idle)
+            gauge('db_pool_connections_max', 'Configured maximum connections', self.max_connections)
+            gauge('db_pool_waiting', 'Threads waiting for a connection', self.waiting)
+            lines.append('# HELP db_pool_checkouts_total Connection checkouts')
+            lines.append('# TYPE db_pool_checkouts_total counter')
+            lines.append(f'db_pool_checkouts_total {self.checkouts}')
+            lines.append('# HELP db_pool_checkout_errors_total Failed connection checkouts')
+            lines.append('# TYPE db_pool_checkout_errors_total counter')
+            lines.append(f'db_pool_checkout_errors_total {self.checkout_errors}')
+
+            lines.append('# HELP db_pool_checkout_wait_seconds Time spent waiting for a connection')
+            lines.append('# TYPE db_pool_checkout_wait_seconds histogram')
+            histogram('db_pool_checkout_wait_seconds', self.wait_histogram)
+
+            lines.append('# HELP db_pool_hold_seconds Time a connection is held, by endpoint')
+            lines.append('# TYPE db_pool_hold_seconds histogram')
+            for endpoint, hist in sorted(self.endpoint_hold.items()):
+                histogram('db_pool_hold_seconds', hist, f'endpoint="{_escape_label(endpoint)}",')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+请求采样分析
+按 PROFILE_SAMPLE_RATE 抽样请求，记录：
+    - 总耗时（wall）
+    - 数据库耗时（语句追踪累计的执行时间，需开启 QUERY_TRACE_ENABLED）
+    - JSON 序列化耗时（jsonify 生成响应的时间）
+    - 可选：cProfile 函数级耗时（PROFILE_CPROFILE=1，开销较大，只建议短时开启）
+按路由汇总为延迟直方图，由管理员接口查看分位数
+"""
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from flask import g
+from flask.json.provider import DefaultJSONProvider
+from app.config import Config
+from app.pool_metrics import Histogram
+from app.query_trace import endpoint_label
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """在被采样的请求中累计 jsonify 的序列化耗时"""
+
+    def response(self, *args, **kwargs):
+        if not g.get('profile_sampled'):
+            return super().response(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return super().response(*args, **kwargs)
+        finally:
+            g.serialize_ms = g.get('serialize_ms', 0.0) + (time.perf_counter() - start) * 1000
+
+
+class _RouteProfile:
+    """单个路由的采样统计（调用方负责加锁）"""
+
+    def __init__(self):
+        self.wall = Histogram()
+        self.db = Histogram()
+        self.serialize = Histogram()
+        self.queries = 0
+        self.errors = 0
+
+    def to_dict(self):
+        count = self.wall.count
+        result = {
+            'samples': count,
+            'errors': self.errors,
+            'avg_queries': round(self.queries / count, 2) if count else None
+        }
+        for name, hist in (('wall', self.wall), ('db', self.db), ('serialize', self.serialize)):
+            result[name] = {
+                'avg_ms': round(hist.sum / hist.count, 3) if hist.count else None,
+                'p50_ms': hist.quantile(0.5),
+                'p90_ms': hist.quantile(0.9),
+                'p99_ms': hist.quantile(0.99),
+                'max_ms': round(hist.max, 3)
+            }
+        return result
+
+
+class RequestProfiler:
+    """请求采样分析器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.routes = {}   # 路由 -> _RouteProfile
+            self.profiles = deque(maxlen=Config.PROFILE_KEEP)
+            self.sampled = 0
+            self.started = time.time()
+
+    def record(self, route, wall_ms, db_ms, serialize_ms, queries, status_code, profile_text=None):
+        with self._lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = _RouteProfile()
+            stats.wall.observe(wall_ms)
+            stats.db.observe(db_ms)
+            stats.serialize.observe(serialize_ms)
+            stats.queries += queries
+            if status_code >= 500:
+                stats.errors += 1
+            self.sampled += 1
+            if profile_text is not None:
+                self.profiles.append({
+                    'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'route': route,
+                    'wall_ms': round(wall_ms, 2),
+                    'profile': profile_text
+                })
+
+    def summary(self):
+        with self._lock:
+            routes = {route: stats.to_dict() for route, stats in self.routes.items()}
+            return {
+                'sample_rate': Config.PROFILE_SAMPLE_RATE,
+                'sampled_requests': self.sampled,
+                'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+                'routes': dict(sorted(routes.items(), key=lambda item: item[1]['wall']['p99_ms'] or 0, reverse=True))
+            }
+
+    def recent_profiles(self, route=None):
+        with self._lock:
+            profiles = list(self.profiles)
+        if route:
+            profiles = [item for item in profiles if item['route'] == route]
+        return profiles[::-1]
+
+
+profiler = RequestProfiler()
+
+
+def _format_profile(prof):
+    output = io.StringIO()
+    pstats.Stats(prof, stream=output).sort_stats('cumulative').print_stats(Config.PROFILE_TOP_FUNCTIONS)
+    return output.getvalue()
+
+
+def init_app(app):
+    """注册采样中间件（PROFILE_SAMPLE_RATE 为 0 时不启用）"""
+    if Config.PROFILE_SAMPLE_RATE <= 0:
+        return
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_profile():
+        if random.random() >= Config.PROFILE_SAMPLE_RATE:
+            return
+        g.profile_sampled = True
+        g.profile_db_start = g.get('db_time_ms', 0.0)
+        g.profile_queries_start = g.get('query_count', 0)
+        if Config.PROFILE_CPROFILE:
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+                g.profile_cprofile = prof
+            except ValueError:
+                pass  # 当前线程已有其他分析器在运行
+        g.profile_start = time.perf_counter()
+
+    @app.after_request
+    def _finish_profile(response):
+        if not g.get('profile_sampled'):
+            return response
+        wall_ms = (time.perf_counter() - g.profile_start) * 1000
+        profile_text = None
+        prof = g.pop('profile_cprofile', None)
+        if prof is not None:
+            prof.disable()
+            profile_text = _format_profile(prof)
+        profiler.record(
+            endpoint_label(),
+            wall_ms,
+            g.get('db_time_ms', 0.0) - g.profile_db_start,
+            g.get('serialize_ms', 0.0),
+            g.get('query_count', 0) - g.profile_queries_start,
+            response.status_code,
+            profile_text
+        )
+        return response
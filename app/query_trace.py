@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+SQL 语句追踪
+连接池取出的连接返回带计时的游标，每条语句执行后生成一个事件：
+    {fingerprint, sql, param_count, rows, elapsed_ms, pool_wait_ms, endpoint}
+事件依次交给已注册的钩子（Database.add_query_hook），内置的 QueryStats 负责：
+    - 按语句指纹汇总次数、耗时、返回行数
+    - 慢查询日志（超过 SLOW_QUERY_MS）
+    - 按接口汇总每个请求的语句数，同一指纹在一个请求中重复执行多次时记为疑似 N+1
+"""
+import re
+import threading
+import time
+from collections import Counter, deque
+from functools import lru_cache
+from flask import g, has_request_context, request
+from app.config import Config
+
+_hooks = []
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:(?:%s|\?)\s*,\s*)+(?:%s|\?)\s*\)')
+_VALUES_LIST = re.compile(r'(VALUES\s*\([^)]*\))(?:\s*,\s*\([^)]*\))+', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """
+    语句指纹：去掉字面量和多余空白，IN (...) 列表和多行 VALUES 折叠为一项，
+    使参数个数不同的同一语句归为一类
+    """
+    text = _WHITESPACE.sub(' ', sql).strip()
+    text = _STRING_LITERAL.sub('?', text)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _PLACEHOLDER_LIST.sub('(...)', text)
+    text = _VALUES_LIST.sub(r'\1, ...', text)
+    return text
+
+
+def endpoint_label():
+    """
+    统计用的接口名：请求中为 Flask endpoint，未匹配到路由的请求统一归为 '<unmatched>'
+    （不使用原始路径，避免随机 URL 使统计项无限增长），请求之外为 'background'
+    """
+    if not has_request_context():
+        return 'background'
+    return request.endpoint or '<unmatched>'
+
+
+def add_hook(hook):
+    """注册语句事件钩子：hook(event)"""
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def _count_params(params, many=False):
+    if not params:
+        return 0
+    if many:
+        return sum(len(row) if isinstance(row, (list, tuple, dict)) else 1 for row in params)
+    return len(params) if isinstance(params, (list, tuple, dict)) else 1
+
+
+def _emit(sql, params, many, rows, elapsed_ms, pool_wait_ms):
+    if not _hooks:
+        return
+    endpoint = endpoint_label()
+    if rows is not None and not 0 <= rows < 2 ** 63:
+        rows = None   # 服务端游标执行后行数未知
+    event = {
+        'fingerprint': fingerprint(sql),
+        'sql': sql,
+        'param_count': _count_params(params, many),
+        'rows': rows,
+        'elapsed_ms': elapsed_ms,
+        'pool_wait_ms': pool_wait_ms,
+        'endpoint': endpoint
+    }
+    for hook in list(_hooks):
+        try:
+            hook(event)
+        except Exception:
+            pass  # 统计失败不影响业务语句
+
+
+class TracedCursor:
+    """带计时的游标包装"""
+
+    def __init__(self, cursor, pool_wait_ms):
+        self._cursor = cursor
+        self._pool_wait_ms = pool_wait_ms
+
+    def execute(self, query, args=None):
+        start = time.perf_counter()
+        result = self._cursor.execute(query, args)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _emit(query, args, False, self._cursor.rowcount, elapsed_ms, self._pool_wait_ms)
+        return result
+
+    def executemany(self, query, args):
+        start = time.perf_counter()
+        result = self._cursor.executemany(query, args)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _emit(query, args, True, self._cursor.rowcount, elapsed_ms, self._pool_wait_ms)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class QueryStats:
+    """内置的语句统计钩子"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}   # fingerprint -> {count, total_ms, max_ms, rows}
+            self.slow_log = deque(maxlen=Config.SLOW_QUERY_LOG_SIZE)
+            self.endpoints = {}    # endpoint -> {requests, queries, max_queries, db_ms, n_plus_one}
+
+    def __call__(self, event):
+        """记录一条语句（注册为钩子）"""
+        with self._lock:
+            stats = self.statements.get(event['fingerprint'])
+            if stats is None:
+                if len(self.statements) >= Config.QUERY_STATS_MAX_FINGERPRINTS:
+                    stats = None
+                else:
+                    stats = self.statements[event['fingerprint']] = {
+                        'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0
+                    }
+            if stats is not None:
+                stats['count'] += 1
+                stats['total_ms'] += event['elapsed_ms']
+                stats['max_ms'] = max(stats['max_ms'], event['elapsed_ms'])
+                stats['rows'] += max(event['rows'] or 0, 0)
+
+            if event['elapsed_ms'] >= Config.SLOW_QUERY_MS:
+                self.slow_log.append({
+                    'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'endpoint': event['endpoint'],
+                    'elapsed_ms': round(event['elapsed_ms'], 2),
+                    'pool_wait_ms': round(event['pool_wait_ms'], 2),
+                    'rows': event['rows'],
+                    'param_count': event['param_count'],
+                    'fingerprint': event['fingerprint']
+                })
+                print(f"慢查询 {event['elapsed_ms']:.1f}ms [{event['endpoint']}] {event['fingerprint'][:200]}")
+
+        if has_request_context():
+            # 按请求累计，请求结束时汇总到接口统计
+            g.query_count = g.get('query_count', 0) + 1
+            g.db_time_ms = g.get('db_time_ms', 0.0) + event['elapsed_ms']
+            if 'query_fingerprints' not in g:
+                g.query_fingerprints = Counter()
+            g.query_fingerprints[event['fingerprint']] += 1
+
+    def record_request(self, endpoint, query_count, db_time_ms, fingerprints):
+        repeated = [fp for fp, count in fingerprints.items() if count >= Config.N_PLUS_ONE_THRESHOLD]
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = {
+                    'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0,
+                    'n_plus_one_requests': 0, 'repeated_statements': set()
+                }
+            stats['requests'] += 1
+            stats['queries'] += query_count
+            stats['max_queries'] = max(stats['max_queries'], query_count)
+            stats['db_ms'] += db_time_ms
+            if repeated:
+                stats['n_plus_one_requests'] += 1
+                stats['repeated_statements'].update(repeated[:5])
+
+    def summary(self, top=20):
+        with self._lock:
+            statements = sorted(self.statements.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+            return {
+                'statements': [
+                    {
+                        'fingerprint': fp,
+                        'count': stats['count'],
+                        'total_ms': round(stats['total_ms'], 2),
+                        'avg_ms': round(stats['total_ms'] / stats['count'], 3),
+                        'max_ms': round(stats['max_ms'], 2),
+                        'avg_rows': round(stats['rows'] / stats['count'], 1)
+                    }
+                    for fp, stats in statements[:top]
+                ],
+                'endpoints': {
+                    endpoint: {
+                        'requests': stats['requests'],
+                        'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                        'max_queries': stats['max_queries'],
+                        'avg_db_ms': round(stats['db_ms'] / stats['requests'], 2),
+                        'n_plus_one_requests': stats['n_plus_one_requests'],
+                        'repeated_statements': sorted(stats['repeated_statements'])
+                    }
+                    for endpoint, stats in sorted(self.endpoints.items())
+                },
+                'slow_queries': list(self.slow_log)[::-1]
+            }
+
+
+query_stats = QueryStats()
+
+
+def init_app(app):
+    """在应用上注册请求结束时的统计汇总，并启用内置统计钩子"""
+    if not Config.QUERY_TRACE_ENABLED:
+        return
+    add_hook(query_stats)
+
+    @app.teardown_request
+    def _record_request_queries(exc):
+        if 'query_count' in g:
+            query_stats.record_request(
+                endpoint_label(), g.query_count, g.db_time_ms, g.query_fingerprints
+            )
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+令牌桶限流
+每个键（IP 或用户名）一个令牌桶：容量为 capacity，每秒补充 rate 个令牌，
+每次请求消耗一个令牌，没有令牌时拒绝并返回需要等待的秒数
+桶数量超过 max_keys 时淘汰最久未使用的桶
+"""
+import threading
+import time
+from collections import OrderedDict
+from app.config import Config
+
+
+class TokenBucketLimiter:
+    """按键的令牌桶限流器"""
+
+    def __init__(self, capacity, rate, max_keys=100000):
+        """
+        :param capacity: 桶容量（允许的突发请求数）
+        :param rate: 每秒补充的令牌数
+        """
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets = OrderedDict()   # key -> (令牌数, 上次更新时间)
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """
+        消耗一个令牌
+        :return: (是否允许, 需要等待的秒数)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0
+            else:
+                self._buckets[key] = (tokens, now)
+                self.rejected += 1
+                allowed, retry_after = False, (1 - tokens) / self.rate
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def refund(self, key):
+        """退还一个令牌（同一请求的其他限流检查未通过时调用）"""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(self.capacity, tokens + 1), updated)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'capacity': self.capacity,
+                'rate_per_second': self.rate,
+                'tracked_keys': len(self._buckets),
+                'rejected': self.rejected
+            }
+
+
+# 认证接口按客户端 IP 限流
+auth_ip_limiter = TokenBucketLimiter(Config.AUTH_RATE_IP_BURST, Config.AUTH_RATE_IP_PER_SECOND)
+
+# 登录、找回密码按用户名限流（防止针对单个账号的暴力破解）
+auth_username_limiter = TokenBucketLimiter(Config.AUTH_RATE_USERNAME_BURST, Config.AUTH_RATE_USERNAME_PER_SECOND)
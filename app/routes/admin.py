@@ -1,9 +1,25 @@
 # -*- coding: utf-8 -*-
-from flask import Blueprint, request, jsonify, session
-from datetime import datetime
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
+from datetime import datetime, timedelta
+from app.config import Config
 from app.database import db, Database
+from app.inventory import Inventory
+from app.seat_map import SeatMapCache
+from app.sales_rollup import SalesRollup, date_range, range_condition
+from app.cache import reference_cache, search_cache, missing_user_cache
+from app.analytics import get_engine as get_analytics_engine
+from app.occupancy import occupancy_report
+from app.profiling import profiler
+from app.session_store import SessionStore
+from app.password_hasher import PasswordHasher
+from app.rate_limit import auth_ip_limiter, auth_username_limiter
+from app.timetable import expand_templates, find_missing_references, find_existing, insert_schedules
 import io
 import csv
+import hmac
+import itertools
+import time
+import zlib
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -52,6 +68,7 @@ def add_station():
              data['station_type'], data.get('address', ''))
         )
         
+        reference_cache.invalidate()
         log_admin_operation('ADD_STATION', f"添加车站: {data['station_name']}", 'Station', station_id)
         
         return jsonify({
@@ -84,6 +101,7 @@ def delete_station(station_id):
         )
         
         if affected > 0:
+            reference_cache.invalidate()
             log_admin_operation('DELETE_STATION', f"删除车站ID: {station_id}", 'Station', station_id)
             return jsonify({'success': True, 'message': '车站删除成功'}), 200
         else:
@@ -112,6 +130,7 @@ def add_city():
              data['station_type'], data.get('address', ''))
         )
         
+        reference_cache.invalidate()
         log_admin_operation('ADD_CITY', f"添加城市: {data['province']}-{data['city']}", 'Station', station_id)
         
         return jsonify({
@@ -170,6 +189,8 @@ def add_schedule():
              data['base_price'], data.get('status', 'normal'), data.get('delay_minutes', 0))
         )
         
+        # 新班次可能出现在任意已缓存的查询结果中
+        search_cache.invalidate()
         log_admin_operation('ADD_SCHEDULE', f"添加班次: {data['schedule_no']}", 'Schedule', schedule_id)
         
         return jsonify({
@@ -207,6 +228,7 @@ def update_schedule(schedule_id):
         affected = db.execute_update(sql, params)
         
         if affected > 0:
+            search_cache.invalidate_tags([schedule_id])
             log_admin_operation('UPDATE_SCHEDULE', f"更新班次ID: {schedule_id}", 'Schedule', schedule_id)
             return jsonify({'success': True, 'message': '班次更新成功'}), 200
         else:
@@ -235,6 +257,8 @@ def delete_schedule(schedule_id):
         )
         
         if affected > 0:
+            search_cache.invalidate_tags([schedule_id])
+            SeatMapCache.invalidate(schedule_id)
             log_admin_operation('DELETE_SCHEDULE', f"删除班次ID: {schedule_id}", 'Schedule', schedule_id)
             return jsonify({'success': True, 'message': '班次删除成功'}), 200
         else:
@@ -256,15 +280,62 @@ def batch_update_price():
     if not all([start_station_id, end_station_id, new_price]):
         return jsonify({'success': False, 'message': '缺少必填字段'}), 400
     
+    # 每个事务更新的班次数（可选）
     try:
-        # 更新符合条件的所有班次票价
-        affected = db.execute_update(
-            """UPDATE Schedule s
-               JOIN Route r ON s.route_id = r.route_id
-               SET s.base_price = %s
-               WHERE r.start_station_id = %s AND r.end_station_id = %s""",
-            (new_price, start_station_id, end_station_id)
+        chunk_size = int(data['chunk_size']) if data.get('chunk_size') else None
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': '分块大小格式不正确'}), 400
+    if chunk_size is not None and chunk_size <= 0:
+        return jsonify({'success': False, 'message': '分块大小必须大于0'}), 400
+    
+    chunk_size = chunk_size or Config.BULK_CHUNK_SIZE
+    
+    @Database.retry_on_deadlock(max_retries=3)
+    def _update_chunk(route_ids, after_id):
+        """按班次ID顺序取下一批班次并更新票价（单独一个事务）"""
+        start = time.perf_counter()
+        route_placeholders = ','.join(['%s'] * len(route_ids))
+        with db.get_cursor(commit=True) as cursor:
+            cursor.execute(
+                f"""SELECT schedule_id FROM Schedule
+                    WHERE route_id IN ({route_placeholders}) AND schedule_id > %s
+                    ORDER BY schedule_id LIMIT %s""",
+                list(route_ids) + [after_id, chunk_size]
+            )
+            schedule_ids = [row['schedule_id'] for row in cursor.fetchall()]
+            affected = 0
+            if schedule_ids:
+                id_placeholders = ','.join(['%s'] * len(schedule_ids))
+                affected = cursor.execute(
+                    f"UPDATE Schedule SET base_price = %s WHERE schedule_id IN ({id_placeholders})",
+                    [new_price] + schedule_ids
+                )
+        return schedule_ids, {
+            'schedules': len(schedule_ids),
+            'affected': affected,
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 2)
+        }
+    
+    started = time.perf_counter()
+    chunks = []
+    try:
+        routes = db.execute_query(
+            "SELECT route_id FROM Route WHERE start_station_id = %s AND end_station_id = %s",
+            (start_station_id, end_station_id)
         )
+        route_ids = [route['route_id'] for route in routes]
+        
+        # 按班次ID键范围分块更新，每个分块一条 UPDATE ... WHERE schedule_id IN (...) 并单独提交，
+        # 避免长时间锁定全部班次；分块之间不是原子的，每提交一个分块就失效对应的查询缓存
+        after_id = 0
+        while route_ids:
+            schedule_ids, chunk = _update_chunk(route_ids, after_id)
+            if not schedule_ids:
+                break
+            search_cache.invalidate_tags(schedule_ids)
+            chunks.append(chunk)
+            after_id = schedule_ids[-1]
+        affected = sum(chunk['affected'] for chunk in chunks)
         
         log_admin_operation(
             'BATCH_UPDATE_PRICE', 
@@ -274,10 +345,117 @@ def batch_update_price():
         
         return jsonify({
             'success': True,
-            'message': f'成功更新{affected}条班次的票价'
+            'message': f'成功更新{affected}条班次的票价',
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+            'chunks': chunks
         }), 200
     except Exception as e:
-        return jsonify({'success': False, 'message': f'更新失败: {str(e)}'}), 500
+        committed = sum(chunk['affected'] for chunk in chunks)
+        return jsonify({
+            'success': False,
+            'message': f'更新失败: {str(e)}（已提交{len(chunks)}个分块，{committed}条班次已更新）'
+        }), 500
+
+
+@admin_bp.route('/schedule/generate', methods=['POST'])
+@require_admin
+def generate_schedules():
+    """
+    按循环模板批量生成班次（时刻表发布）
+    参数：schedule_no, route_id, vehicle_id, departure_time, arrival_time, base_price,
+          start_date, end_date, weekdays（1-7，可选）；多个车次可放在 templates 数组中
+          skip_existing：已存在的 (班次号, 日期) 是否跳过，缺省时存在冲突则整体拒绝
+          chunk_size：每个事务写入的班次数（可选）
+    """
+    data = request.get_json() or {}
+    
+    try:
+        rows = expand_templates(data)
+        chunk_size = int(data['chunk_size']) if data.get('chunk_size') else None
+        if chunk_size is not None and chunk_size <= 0:
+            raise ValueError('分块大小必须大于0')
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if not rows:
+        return jsonify({'success': False, 'message': '日期范围内没有需要开行的班次'}), 400
+    
+    try:
+        error = find_missing_references(rows)
+        if error:
+            return jsonify({'success': False, 'message': error}), 400
+        
+        # 在内存中对照唯一索引 uk_schedule_date 检查冲突
+        existing = find_existing(rows)
+        if existing and not data.get('skip_existing'):
+            conflicts = sorted(existing)[:20]
+            return jsonify({
+                'success': False,
+                'message': f'{len(existing)}个班次已存在',
+                'conflicts': [{'schedule_no': no, 'departure_date': day.strftime('%Y-%m-%d')} for no, day in conflicts]
+            }), 409
+        rows = [row for row in rows if (row[0], row[3]) not in existing]
+        
+        try:
+            bulk = insert_schedules(rows, chunk_size)
+        finally:
+            # 分块之间不是原子的，后面的分块失败时前面的分块已经提交，无论成败都失效查询缓存
+            search_cache.invalidate()
+        
+        log_admin_operation(
+            'GENERATE_SCHEDULES',
+            f"批量生成班次: {len(rows)}个, 跳过已存在{len(existing)}个",
+            'Schedule'
+        )
+        
+        elapsed = bulk['elapsed_ms'] / 1000
+        return jsonify({
+            'success': True,
+            'message': f'成功生成{len(rows)}个班次',
+            'created': len(rows),
+            'skipped': len(existing),
+            'elapsed_ms': bulk['elapsed_ms'],
+            'rows_per_second': round(len(rows) / elapsed, 1) if elapsed > 0 else None,
+            'chunks': bulk['chunks']
+        }), 201
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'生成失败: {str(e)}'}), 500
+
+
+@admin_bp.route('/inventory/reconcile', methods=['POST'])
+@require_admin
+def reconcile_inventory():
+    """校准班次库存（根据有效车票重新计算已售座位数）"""
+    data = request.get_json(silent=True) or {}
+    try:
+        schedule_id = int(data['schedule_id']) if data.get('schedule_id') else None
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': '班次ID格式不正确'}), 400
+    
+    try:
+        affected = Inventory.reconcile(schedule_id)
+        
+        # 座位占用和已售数已按车票重建，丢弃缓存中的座位位图和查询结果
+        SeatMapCache.invalidate(schedule_id)
+        if schedule_id:
+            search_cache.invalidate_tags([schedule_id])
+        else:
+            search_cache.invalidate()
+        
+        log_admin_operation(
+            'RECONCILE_INVENTORY',
+            f"校准班次库存: {schedule_id if schedule_id else '全部班次'}",
+            'Schedule_Inventory',
+            schedule_id
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': '库存校准完成',
+            'affected': affected
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'校准失败: {str(e)}'}), 500
 
 
 # ==================== 线路管理 ====================
@@ -300,6 +478,7 @@ def add_route():
              data['route_type'], data.get('total_distance', 0))
         )
         
+        reference_cache.invalidate()
         log_admin_operation('ADD_ROUTE', f"添加线路: {data['route_name']}", 'Route', route_id)
         
         return jsonify({
@@ -331,6 +510,7 @@ def delete_route(route_id):
         )
         
         if affected > 0:
+            reference_cache.invalidate()
             log_admin_operation('DELETE_ROUTE', f"删除线路ID: {route_id}", 'Route', route_id)
             return jsonify({'success': True, 'message': '线路删除成功'}), 200
         else:
@@ -344,32 +524,28 @@ def delete_route(route_id):
 @admin_bp.route('/report/sales', methods=['GET'])
 @require_admin
 def get_sales_report():
-    """销售报表"""
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+    """销售报表（读取销售日汇总表）"""
+    try:
+        start, end = date_range(request.args.get('start_date'), request.args.get('end_date'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    sql = """
+    # 半开区间 [start, end)，直接使用主键 (sale_date, slot) 的范围扫描
+    where, params = range_condition('sale_date', start and start.date(), end and end.date())
+    sql = f"""
         SELECT 
-            DATE(o.order_time) as order_date,
-            COUNT(DISTINCT CASE WHEN o.status = 'confirmed' THEN o.order_id END) as order_count,
-            COUNT(DISTINCT CASE WHEN o.status = 'refunded' THEN o.order_id END) as refunded_count,
-            SUM(CASE WHEN o.status = 'confirmed' THEN o.ticket_count ELSE 0 END) as ticket_count,
-            SUM(CASE WHEN o.status = 'confirmed' THEN o.total_amount ELSE 0 END) as total_sales,
-            SUM(CASE WHEN o.status = 'refunded' THEN o.total_amount ELSE 0 END) as refunded_amount,
-            COUNT(DISTINCT CASE WHEN o.order_type = 'group' AND o.status = 'confirmed' THEN o.order_id END) as group_order_count
-        FROM `Order` o
-        WHERE o.status IN ('confirmed', 'refunded')
+            sale_date as order_date,
+            SUM(order_count) as order_count,
+            SUM(refunded_count) as refunded_count,
+            SUM(ticket_count) as ticket_count,
+            SUM(total_sales) as total_sales,
+            SUM(refunded_amount) as refunded_amount,
+            SUM(group_order_count) as group_order_count
+        FROM Daily_Sales
+        WHERE {where}
     """
     
-    params = []
-    if start_date:
-        sql += " AND o.order_time >= %s"
-        params.append(start_date)
-    if end_date:
-        sql += " AND o.order_time <= %s"
-        params.append(end_date + ' 23:59:59')
-    
-    sql += " GROUP BY DATE(o.order_time) ORDER BY order_date DESC"
+    sql += " GROUP BY sale_date HAVING SUM(order_count) > 0 OR SUM(refunded_count) > 0 ORDER BY sale_date DESC"
     
     try:
         results = db.execute_query(sql, params)
@@ -377,6 +553,8 @@ def get_sales_report():
         for result in results:
             if result['order_date']:
                 result['order_date'] = result['order_date'].strftime('%Y-%m-%d')
+            for key in ('order_count', 'refunded_count', 'ticket_count', 'group_order_count'):
+                result[key] = int(result[key] or 0)
             result['total_sales'] = float(result['total_sales'] or 0)
             result['refunded_amount'] = float(result['refunded_amount'] or 0)
             # 计算实际收入（销售额 - 退款额）
@@ -393,22 +571,22 @@ def get_sales_report():
 @admin_bp.route('/report/schedule', methods=['GET'])
 @require_admin
 def get_schedule_report():
-    """班次统计报表"""
+    """班次统计报表（订单数据读取班次销售汇总表）"""
     try:
         sql = """
             SELECT 
                 s.schedule_no,
                 r.route_name,
-                COUNT(DISTINCT s.schedule_id) as total_schedules,
+                COUNT(s.schedule_id) as total_schedules,
                 SUM(CASE WHEN s.status = 'normal' THEN 1 ELSE 0 END) as normal_count,
                 SUM(CASE WHEN s.status = 'delayed' THEN 1 ELSE 0 END) as delayed_count,
                 SUM(CASE WHEN s.status = 'cancelled' THEN 1 ELSE 0 END) as cancelled_count,
-                COUNT(DISTINCT CASE WHEN o.status = 'confirmed' THEN o.order_id END) as order_count,
-                COUNT(DISTINCT CASE WHEN o.status = 'refunded' THEN o.order_id END) as refunded_order_count,
-                COALESCE(SUM(CASE WHEN o.status = 'confirmed' THEN o.total_amount ELSE 0 END), 0) as total_revenue
+                COALESCE(SUM(ss.order_count), 0) as order_count,
+                COALESCE(SUM(ss.refunded_order_count), 0) as refunded_order_count,
+                COALESCE(SUM(ss.total_revenue), 0) as total_revenue
             FROM Schedule s
             JOIN Route r ON s.route_id = r.route_id
-            LEFT JOIN `Order` o ON s.schedule_id = o.schedule_id
+            LEFT JOIN Schedule_Sales ss ON s.schedule_id = ss.schedule_id
             GROUP BY s.schedule_no, r.route_name
             ORDER BY total_revenue DESC
         """
@@ -416,6 +594,8 @@ def get_schedule_report():
         results = db.execute_query(sql)
         
         for result in results:
+            for key in ('normal_count', 'delayed_count', 'cancelled_count', 'order_count', 'refunded_order_count'):
+                result[key] = int(result[key] or 0)
             result['total_revenue'] = float(result['total_revenue'] or 0)
         
         return jsonify({
@@ -429,28 +609,23 @@ def get_schedule_report():
 @admin_bp.route('/report/refund', methods=['GET'])
 @require_admin
 def get_refund_report():
-    """退票统计报表"""
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+    """退票统计报表（读取退票日汇总表）"""
+    try:
+        start, end = date_range(request.args.get('start_date'), request.args.get('end_date'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    sql = """
+    where, params = range_condition('refund_date', start and start.date(), end and end.date())
+    sql = f"""
         SELECT 
-            DATE(r.refund_time) as refund_date,
-            COUNT(r.refund_id) as refund_count,
-            SUM(r.refund_amount) as total_refund_amount
-        FROM Refund r
-        WHERE 1=1
+            refund_date,
+            SUM(refund_count) as refund_count,
+            SUM(total_refund_amount) as total_refund_amount
+        FROM Daily_Refund
+        WHERE {where}
     """
     
-    params = []
-    if start_date:
-        sql += " AND r.refund_time >= %s"
-        params.append(start_date)
-    if end_date:
-        sql += " AND r.refund_time <= %s"
-        params.append(end_date + ' 23:59:59')
-    
-    sql += " GROUP BY DATE(r.refund_time) ORDER BY refund_date DESC"
+    sql += " GROUP BY refund_date ORDER BY refund_date DESC"
     
     try:
         results = db.execute_query(sql, params)
@@ -458,6 +633,7 @@ def get_refund_report():
         for result in results:
             if result['refund_date']:
                 result['refund_date'] = result['refund_date'].strftime('%Y-%m-%d')
+            result['refund_count'] = int(result['refund_count'] or 0)
             result['total_refund_amount'] = float(result['total_refund_amount'] or 0)
         
         return jsonify({
@@ -468,57 +644,211 @@ def get_refund_report():
         return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
 
 
-@admin_bp.route('/report/export', methods=['GET'])
+@admin_bp.route('/report/occupancy', methods=['GET'])
 @require_admin
-def export_report():
-    """导出综合报表为CSV"""
+def get_occupancy_report():
+    """
+    上座率报表（已售座位数读取班次库存表）
+    参数 start_date、end_date：发车日期范围，缺省为今天起 OCCUPANCY_DEFAULT_DAYS 天
+    参数 route_id（可选）；group_by=schedule|route|day，缺省按线路
+    """
+    group_by = request.args.get('group_by', 'route')
+    if group_by not in ('schedule', 'route', 'day'):
+        return jsonify({'success': False, 'message': '分组方式不正确'}), 400
+    
     try:
-        # 获取综合数据
-        sql = """
-            SELECT 
-                o.order_id,
-                u.username,
-                u.real_name,
-                s.schedule_no,
-                r.route_name,
-                st_start.station_name AS start_station,
-                st_end.station_name AS end_station,
-                s.departure_date,
-                s.departure_time,
-                o.order_time,
-                o.ticket_count,
-                o.total_amount,
-                o.order_type,
-                o.status
-            FROM `Order` o
-            JOIN User u ON o.user_id = u.user_id
-            JOIN Schedule s ON o.schedule_id = s.schedule_id
-            JOIN Route r ON s.route_id = r.route_id
-            JOIN Station st_start ON r.start_station_id = st_start.station_id
-            JOIN Station st_end ON r.end_station_id = st_end.station_id
-            ORDER BY o.order_time DESC
-            LIMIT 1000
-        """
+        start, end = date_range(request.args.get('start_date'), request.args.get('end_date'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if start is None and end is None:
+        start, end = today, today + timedelta(days=Config.OCCUPANCY_DEFAULT_DAYS)
+    
+    try:
+        report, summary = occupancy_report(
+            start and start.date(), end and end.date(), request.args.get('route_id', type=int), group_by
+        )
         
-        results = db.execute_query(sql)
+        response = jsonify({
+            'success': True,
+            'summary': summary,
+            'report': report
+        })
+        # 实时容量视图，不缓存
+        response.headers['Cache-Control'] = 'no-store'
+        return response, 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
+
+
+@admin_bp.route('/report/rollup/rebuild', methods=['POST'])
+@require_admin
+def rebuild_report_rollup():
+    """
+    根据订单和退票记录重建报表汇总表
+    参数 start_date、end_date（可选）：只重建该日期范围内的日汇总
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        start, end = date_range(data.get('start_date'), data.get('end_date'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        affected = SalesRollup.rebuild(start, end)
         
-        # 格式化时间
-        for result in results:
-            if result['order_time']:
-                result['order_time'] = result['order_time'].strftime('%Y-%m-%d %H:%M:%S')
-            if result['departure_date']:
-                result['departure_date'] = result['departure_date'].strftime('%Y-%m-%d')
-            if result['departure_time']:
-                result['departure_time'] = str(result['departure_time'])
+        scope = f"{data.get('start_date') or '最早'} 至 {data.get('end_date') or '最新'}" if start or end else '全部'
+        log_admin_operation('REBUILD_ROLLUP', f"重建报表汇总表（{scope}），销售日汇总{affected}行", 'Daily_Sales')
         
-        log_admin_operation('EXPORT_REPORT', f"导出报表，共{len(results)}条记录")
+        return jsonify({
+            'success': True,
+            'message': f'报表汇总重建完成，销售日汇总{affected}行'
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'重建失败: {str(e)}'}), 500
+
+
+@admin_bp.route('/analytics/<report>', methods=['GET'])
+@require_admin
+def get_analytics_report(report):
+    """
+    内存列式分析报表（需开启 ANALYTICS_ENABLED）
+    report：sales / refund / route_revenue / load_factor / status
+    参数 start_date、end_date（可选）；load_factor 支持 group_by=route|day
+    """
+    if not Config.ANALYTICS_ENABLED:
+        return jsonify({'success': False, 'message': '分析模块未启用'}), 404
+    if report not in ('sales', 'refund', 'route_revenue', 'load_factor', 'status'):
+        return jsonify({'success': False, 'message': '未知的报表类型'}), 404
+    
+    try:
+        start, end = date_range(request.args.get('start_date'), request.args.get('end_date'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        engine = get_analytics_engine()
+        if report == 'status':
+            return jsonify({'success': True, 'status': engine.status()}), 200
+        if report == 'sales':
+            results = engine.sales(start, end)
+        elif report == 'refund':
+            results = engine.refunds_by_day(start, end)
+        elif report == 'route_revenue':
+            results = engine.route_revenue(start, end)
+        else:
+            group_by = 'day' if request.args.get('group_by') == 'day' else 'route'
+            results = engine.load_factor(start, end, group_by)
         
         return jsonify({
             'success': True,
-            'data': results
+            'report': results
         }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
+
+
+EXPORT_COLUMNS = [
+    ('order_id', '订单ID'), ('username', '用户名'), ('real_name', '姓名'), ('schedule_no', '班次号'),
+    ('route_name', '线路'), ('start_station', '起点'), ('end_station', '终点'),
+    ('departure_date', '发车日期'), ('departure_time', '发车时间'), ('order_time', '下单时间'),
+    ('ticket_count', '票数'), ('total_amount', '总金额'), ('order_type', '订单类型'), ('status', '状态')
+]
+
+
+def _export_csv_chunks(first_row, rows):
+    """把查询结果逐行写成CSV，每积累一定行数输出一次"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM 便于 Excel 识别 UTF-8
+    buffer.write('\ufeff')
+    writer.writerow([title for _, title in EXPORT_COLUMNS])
+    
+    count = 0
+    for row in itertools.chain([first_row], rows) if first_row else ():
+        writer.writerow([row[key] for key, _ in EXPORT_COLUMNS])
+        count += 1
+        if count % Config.EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+    
+    log_admin_operation('EXPORT_REPORT', f"导出报表，共{count}条记录")
+
+
+def _gzip_chunks(chunks):
+    """流式gzip压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@admin_bp.route('/report/export', methods=['GET'])
+@require_admin
+def export_report():
+    """
+    流式导出综合报表为CSV
+    使用服务端游标逐行读取，内存占用与导出行数无关
+    参数 start_date、end_date（可选）：按下单日期过滤
+    参数 gzip=1：输出 gzip 压缩的 .csv.gz 文件
+    """
+    try:
+        start, end = date_range(request.args.get('start_date'), request.args.get('end_date'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    where, params = range_condition('o.order_time', start, end)
+    sql = f"""
+        SELECT 
+            o.order_id,
+            u.username,
+            u.real_name,
+            s.schedule_no,
+            r.route_name,
+            st_start.station_name AS start_station,
+            st_end.station_name AS end_station,
+            s.departure_date,
+            s.departure_time,
+            o.order_time,
+            o.ticket_count,
+            o.total_amount,
+            o.order_type,
+            o.status
+        FROM `Order` o
+        JOIN User u ON o.user_id = u.user_id
+        JOIN Schedule s ON o.schedule_id = s.schedule_id
+        JOIN Route r ON s.route_id = r.route_id
+        JOIN Station st_start ON r.start_station_id = st_start.station_id
+        JOIN Station st_end ON r.end_station_id = st_end.station_id
+        WHERE {where}
+        ORDER BY o.order_time DESC
+    """
+    
+    try:
+        rows = db.stream_query(sql, params, fetch_size=Config.EXPORT_FETCH_SIZE)
+        # 先取第一行，查询出错时仍可返回错误信息
+        first_row = next(rows, None)
     except Exception as e:
         return jsonify({'success': False, 'message': f'导出失败: {str(e)}'}), 500
+    
+    chunks = _export_csv_chunks(first_row, rows)
+    filename = f"report_{datetime.now().strftime('%Y%m%d')}.csv"
+    if request.args.get('gzip') in ('1', 'true'):
+        chunks = _gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        mimetype = 'text/csv'
+    
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 
 @admin_bp.route('/logs', methods=['GET'])
@@ -650,3 +980,104 @@ def get_pool_status():
     except Exception as e:
         return jsonify({'success': False, 'message': f'获取连接池状态失败: {str(e)}'}), 500
 
+
+@admin_bp.route('/pool/metrics', methods=['GET'])
+def get_pool_metrics():
+    """
+    连接池指标（Prometheus 文本格式）
+    管理员会话可直接访问；配置了 METRICS_TOKEN 时，采集端可用 Authorization: Bearer <token> 访问
+    """
+    token = Config.METRICS_TOKEN
+    authorized = session.get('is_admin', False) or (
+        token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    )
+    if not authorized:
+        return jsonify({'success': False, 'message': '需要管理员权限'}), 403
+    
+    return Response(Database.get_pool_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@admin_bp.route('/queries/stats', methods=['GET'])
+@require_admin
+def get_query_stats():
+    """
+    SQL 语句统计
+    参数: top（返回耗时最多的前 N 个语句指纹，默认 20）
+    返回按接口的每请求语句数（avg_queries/max_queries 偏大或 n_plus_one_requests 非零的接口可能存在 N+1 查询）和最近的慢查询
+    """
+    try:
+        top = min(max(request.args.get('top', 20, type=int), 1), 200)
+        return jsonify({
+            'success': True,
+            'slow_query_ms': Config.SLOW_QUERY_MS,
+            'query_stats': Database.get_query_stats(top)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取语句统计失败: {str(e)}'}), 500
+
+
+@admin_bp.route('/queries/reset', methods=['POST'])
+@require_admin
+def reset_query_stats():
+    """清空 SQL 语句统计"""
+    Database.reset_query_stats()
+    log_admin_operation('RESET_QUERY_STATS', '清空SQL语句统计')
+    return jsonify({'success': True, 'message': '语句统计已清空'}), 200
+
+
+@admin_bp.route('/profiling/routes', methods=['GET'])
+@require_admin
+def get_route_latency():
+    """
+    按路由的请求延迟分位数（需设置 PROFILE_SAMPLE_RATE 开启采样）
+    wall 为总耗时，db 为数据库语句耗时，serialize 为 JSON 序列化耗时
+    """
+    if Config.PROFILE_SAMPLE_RATE <= 0:
+        return jsonify({'success': False, 'message': '未开启请求采样（PROFILE_SAMPLE_RATE）'}), 400
+    return jsonify({'success': True, 'profiling': profiler.summary()}), 200
+
+
+@admin_bp.route('/profiling/profiles', methods=['GET'])
+@require_admin
+def get_recent_profiles():
+    """最近的 cProfile 结果，可用 route 参数按路由过滤（需设置 PROFILE_CPROFILE=1）"""
+    if not Config.PROFILE_CPROFILE:
+        return jsonify({'success': False, 'message': '未开启 cProfile 采样（PROFILE_CPROFILE）'}), 400
+    return jsonify({'success': True, 'profiles': profiler.recent_profiles(request.args.get('route'))}), 200
+
+
+@admin_bp.route('/profiling/reset', methods=['POST'])
+@require_admin
+def reset_profiling():
+    """清空请求采样统计"""
+    profiler.reset()
+    log_admin_operation('RESET_PROFILING', '清空请求采样统计')
+    return jsonify({'success': True, 'message': '采样统计已清空'}), 200
+
+
+@admin_bp.route('/sessions/status', methods=['GET'])
+@require_admin
+def get_session_status():
+    """会话存储状态（缓存会话数、待写入/待删除数、过期清理情况）"""
+    return jsonify({'success': True, 'session_store': SessionStore.stats()}), 200
+
+
+@admin_bp.route('/hasher/status', methods=['GET'])
+@require_admin
+def get_hasher_status():
+    """密码哈希线程池状态（排队数、拒绝数、平均计算耗时）"""
+    return jsonify({'success': True, 'password_hasher': PasswordHasher.stats()}), 200
+
+
+@admin_bp.route('/auth/throttle', methods=['GET'])
+@require_admin
+def get_auth_throttle_status():
+    """认证接口限流状态（按 IP / 用户名的令牌桶和不存在用户名缓存）"""
+    return jsonify({
+        'success': True,
+        'throttle': {
+            'ip': auth_ip_limiter.stats(),
+            'username': auth_username_limiter.stats(),
+            'missing_user_cache_size': len(missing_user_cache)
+        }
+    }), 200
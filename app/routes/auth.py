@@ -3,15 +3,60 @@
 认证相关路由
 """
 from flask import Blueprint, request, jsonify, session
-import bcrypt
-import secrets
-from datetime import datetime, timedelta
+import math
+import time
+import pymysql
 from app.database import db
 from app.config import Config
+from app.cache import missing_user_cache
+from app.rate_limit import auth_ip_limiter, auth_username_limiter
+from app.session_store import SessionStore
+from app.password_hasher import PasswordHasher, HasherBusyError
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
 
+def _throttle(username=None):
+    """
+    认证接口限流：先按客户端 IP，再按用户名（如有）各消耗一个令牌，
+    用户名被限流时退还 IP 的令牌，避免针对单个账号的重试耗尽同一 IP 的额度
+    AUTH_RATE_LIMIT_ENABLED 关闭时不限流
+    :return: 被限流时返回 429 响应，否则返回 None
+    """
+    if not Config.AUTH_RATE_LIMIT_ENABLED:
+        return None
+    allowed, retry_after = auth_ip_limiter.acquire(request.remote_addr)
+    if allowed and username:
+        allowed, retry_after = auth_username_limiter.acquire(str(username).lower())
+        if not allowed:
+            auth_ip_limiter.refund(request.remote_addr)
+    if allowed:
+        return None
+    retry_after = max(1, math.ceil(retry_after))
+    response = jsonify({'success': False, 'message': f'请求过于频繁，请 {retry_after} 秒后重试'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+
+def _find_user(columns, username):
+    """
+    按用户名查询用户
+    不存在的用户名短时间缓存（MISSING_USER_CACHE_TTL），重复查询同一个不存在的用户名时不再访问数据库
+    """
+    key = str(username).lower()   # 用户名列的排序规则不区分大小写
+    if missing_user_cache.get(key):
+        return None
+    version = missing_user_cache.version
+    user = db.execute_query(
+        f"SELECT {columns} FROM User WHERE username = %s",
+        (username,),
+        fetch_one=True
+    )
+    if user is None:
+        missing_user_cache.set(key, True, version)
+    return user
+
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """用户注册"""
@@ -28,18 +73,21 @@ def register():
     security_question = data['security_question']
     security_answer = data['security_answer']
     
+    throttled = _throttle()
+    if throttled:
+        return throttled
+    
     # 检查用户名是否已存在
-    existing_user = db.execute_query(
-        "SELECT user_id FROM User WHERE username = %s",
-        (username,),
-        fetch_one=True
-    )
+    existing_user = _find_user("user_id", username)
     
     if existing_user:
         return jsonify({'success': False, 'message': '用户名已存在'}), 400
     
     # 加密密码
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    try:
+        hashed_password = PasswordHasher.hash(password)
+    except HasherBusyError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
     
     # 插入用户记录
     try:
@@ -48,16 +96,31 @@ def register():
                VALUES (%s, %s, %s, %s, %s, FALSE)""",
             (username, hashed_password, real_name, security_question, security_answer)
         )
+        missing_user_cache.invalidate(str(username).lower())
         
         return jsonify({
             'success': True,
             'message': '注册成功',
             'user_id': user_id
         }), 201
+    except pymysql.err.IntegrityError:
+        # 并发注册同一用户名（或不存在用户名缓存已过时）时由唯一索引拦截
+        return jsonify({'success': False, 'message': '用户名已存在'}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': f'注册失败: {str(e)}'}), 500
 
 
+def _rehash_password(user_id, old_hash, password):
+    """BCRYPT_ROUNDS 调整后，登录成功时用新的 cost 重新计算哈希（失败不影响登录）"""
+    try:
+        db.execute_update(
+            "UPDATE User SET password = %s WHERE user_id = %s AND password = %s",
+            (PasswordHasher.hash(password), user_id, old_hash)
+        )
+    except Exception as e:
+        print(f"密码哈希升级失败: {str(e)}")
+
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """用户登录"""
@@ -69,20 +132,24 @@ def login():
     if not username or not password:
         return jsonify({'success': False, 'message': '用户名和密码不能为空'}), 400
     
+    throttled = _throttle(username)
+    if throttled:
+        return throttled
+    
     # 查询用户
-    user = db.execute_query(
-        "SELECT user_id, username, password, real_name, is_admin FROM User WHERE username = %s",
-        (username,),
-        fetch_one=True
-    )
+    user = _find_user("user_id, username, password, real_name, is_admin", username)
     
     if not user:
         return jsonify({'success': False, 'message': '用户名或密码错误'}), 401
     
     # 验证密码
     try:
-        if not bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
+        if not PasswordHasher.verify(password, user['password']):
             return jsonify({'success': False, 'message': '用户名或密码错误'}), 401
+        if PasswordHasher.needs_rehash(user['password']):
+            _rehash_password(user['user_id'], user['password'], password)
+    except HasherBusyError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
     except Exception:
         # 如果是管理员且密码是明文（用于测试）
         if user['username'] == Config.ADMIN_USERNAME and password == Config.ADMIN_PASSWORD:
@@ -90,23 +157,16 @@ def login():
         else:
             return jsonify({'success': False, 'message': '用户名或密码错误'}), 401
     
-    # 创建会话
-    session_id = secrets.token_hex(32)
-    token = secrets.token_hex(64)
-    expire_time = datetime.now() + timedelta(seconds=Config.SESSION_TIMEOUT)
-    
+    # 创建会话（Session 表由会话存储批量写入）
     try:
-        db.execute_insert(
-            """INSERT INTO Session (session_id, user_id, login_time, expire_time, token, device_info)
-               VALUES (%s, %s, %s, %s, %s, %s)""",
-            (session_id, user['user_id'], datetime.now(), expire_time, token, request.user_agent.string)
-        )
+        token = SessionStore.create(user['user_id'], request.user_agent.string)
         
         # 设置Flask session
         session['user_id'] = user['user_id']
         session['username'] = user['username']
         session['is_admin'] = bool(user['is_admin'])
         session['token'] = token
+        session['issued_at'] = time.time()
         
         return jsonify({
             'success': True,
@@ -130,7 +190,7 @@ def logout():
     
     if token:
         # 删除会话记录
-        db.execute_update("DELETE FROM Session WHERE token = %s", (token,))
+        SessionStore.revoke(token)
     
     # 清除Flask session
     session.clear()
@@ -150,12 +210,12 @@ def reset_password():
     if not all([username, security_answer, new_password]):
         return jsonify({'success': False, 'message': '缺少必填字段'}), 400
     
+    throttled = _throttle(username)
+    if throttled:
+        return throttled
+    
     # 查询用户
-    user = db.execute_query(
-        "SELECT user_id, security_answer FROM User WHERE username = %s",
-        (username,),
-        fetch_one=True
-    )
+    user = _find_user("user_id, security_answer", username)
     
     if not user:
         return jsonify({'success': False, 'message': '用户不存在'}), 404
@@ -165,7 +225,10 @@ def reset_password():
         return jsonify({'success': False, 'message': '安全问题答案错误'}), 401
     
     # 加密新密码
-    hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    try:
+        hashed_password = PasswordHasher.hash(new_password)
+    except HasherBusyError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
     
     # 更新密码
     try:
@@ -187,11 +250,11 @@ def get_security_question():
     if not username:
         return jsonify({'success': False, 'message': '用户名不能为空'}), 400
     
-    user = db.execute_query(
-        "SELECT security_question FROM User WHERE username = %s",
-        (username,),
-        fetch_one=True
-    )
+    throttled = _throttle(username)
+    if throttled:
+        return throttled
+    
+    user = _find_user("security_question", username)
     
     if not user:
         return jsonify({'success': False, 'message': '用户不存在'}), 404
@@ -4,7 +4,18 @@
 """
 from flask import Blueprint, request, jsonify, session
 from datetime import datetime
+import hashlib
+import json
 from app.database import db, Database
+from app.config import Config
+from app.cache import reference_cache, search_cache
+from app.inventory import Inventory, SeatOccupancy
+from app.seat_map import SeatMapCache
+from app.booking import BookingRequest, book
+from app.booking_queue import BookingQueue
+from app.station_index import resolve_stations
+from app.journey import JourneyPlanner, get_route_network
+from app.sales_rollup import SalesRollup
 import pymysql
 
 ticket_bp = Blueprint('ticket', __name__, url_prefix='/api/ticket')
@@ -20,16 +31,11 @@ def require_login(f):
     return wrapper
 
 
-@ticket_bp.route('/search', methods=['GET'])
-def search_schedules():
-    date = request.args.get('date')
-    start_city = request.args.get('start_city')
-    end_city = request.args.get('end_city')
-    start_station_id = request.args.get('start_station_id')
-    end_station_id = request.args.get('end_station_id')
-    schedule_no = request.args.get('schedule_no')
-    
-    # 构建查询SQL
+SEARCH_FIELDS = ('date', 'start_city', 'end_city', 'start_station_id', 'end_station_id', 'schedule_no')
+
+
+def _load_schedules(filters):
+    """查询符合条件的班次静态信息（不含余票，可缓存）"""
     sql = """
         SELECT 
             s.schedule_id,
@@ -49,11 +55,7 @@ def search_schedules():
             st_end.city AS end_city,
             v.vehicle_no,
             v.vehicle_type,
-            v.seat_count,
-            v.seat_count - COALESCE(
-                (SELECT COUNT(*) FROM Ticket t 
-                 WHERE t.schedule_id = s.schedule_id AND t.status = 'valid'), 0
-            ) AS available_seats
+            v.seat_count
         FROM Schedule s
         JOIN Route r ON s.route_id = r.route_id
         JOIN Station st_start ON r.start_station_id = st_start.station_id
@@ -64,47 +66,119 @@ def search_schedules():
     
     params = []
     
-    if date:
+    if filters['date']:
         sql += " AND s.departure_date = %s"
-        params.append(date)
-    
-    if start_city:
-        sql += " AND st_start.city LIKE %s"
-        params.append(f'%{start_city}%')
+        params.append(filters['date'])
     
-    if end_city:
-        sql += " AND st_end.city LIKE %s"
-        params.append(f'%{end_city}%')
+    # 城市条件先解析为车站ID集合，走 Route 上的车站索引
+    for field, column in (('start_city', 'r.start_station_id'), ('end_city', 'r.end_station_id')):
+        if filters[field]:
+            station_ids = resolve_stations(filters[field])
+            if not station_ids:
+                return []
+            placeholders = ','.join(['%s'] * len(station_ids))
+            sql += f" AND {column} IN ({placeholders})"
+            params.extend(sorted(station_ids))
     
-    if start_station_id:
+    if filters['start_station_id']:
         sql += " AND r.start_station_id = %s"
-        params.append(start_station_id)
+        params.append(filters['start_station_id'])
     
-    if end_station_id:
+    if filters['end_station_id']:
         sql += " AND r.end_station_id = %s"
-        params.append(end_station_id)
+        params.append(filters['end_station_id'])
     
-    if schedule_no:
+    if filters['schedule_no']:
         sql += " AND s.schedule_no LIKE %s"
-        params.append(f'%{schedule_no}%')
+        params.append(f"%{filters['schedule_no']}%")
     
     sql += " ORDER BY s.departure_date, s.departure_time"
     
+    results = db.execute_query(sql, params)
+    
+    # 格式化时间字段
+    for result in results:
+        if result['departure_date']:
+            result['departure_date'] = result['departure_date'].strftime('%Y-%m-%d')
+        if result['departure_time']:
+            result['departure_time'] = str(result['departure_time'])
+        if result['arrival_time']:
+            result['arrival_time'] = str(result['arrival_time'])
+    
+    return results
+
+
+def _with_available_seats(schedules):
+    """在班次静态信息上叠加实时余票（按主键读取库存计数）"""
+    if not schedules:
+        return []
+    
+    schedule_ids = [schedule['schedule_id'] for schedule in schedules]
+    placeholders = ','.join(['%s'] * len(schedule_ids))
+    rows = db.execute_query(
+        f"SELECT schedule_id, sold_seats FROM Schedule_Inventory WHERE schedule_id IN ({placeholders})",
+        schedule_ids
+    )
+    sold = {row['schedule_id']: row['sold_seats'] for row in rows}
+    
+    results = []
+    for schedule in schedules:
+        result = dict(schedule)
+        result['available_seats'] = schedule['seat_count'] - sold.get(schedule['schedule_id'], 0)
+        results.append(result)
+    return results
+
+
+@ticket_bp.route('/search', methods=['GET'])
+def search_schedules():
+    # 规范化查询条件作为缓存键
+    filters = {}
+    for field in SEARCH_FIELDS:
+        value = (request.args.get(field) or '').strip()
+        filters[field] = value or None
+    cache_key = tuple(filters[field] for field in SEARCH_FIELDS)
+    
     try:
-        results = db.execute_query(sql, params)
+        schedules = search_cache.get_or_load(
+            cache_key,
+            lambda: _load_schedules(filters),
+            tags_of=lambda rows: [row['schedule_id'] for row in rows]
+        )
         
-        # 格式化时间字段
-        for result in results:
-            if result['departure_date']:
-                result['departure_date'] = result['departure_date'].strftime('%Y-%m-%d')
-            if result['departure_time']:
-                result['departure_time'] = str(result['departure_time'])
-            if result['arrival_time']:
-                result['arrival_time'] = str(result['arrival_time'])
+        return jsonify({
+            'success': True,
+            'schedules': _with_available_seats(schedules)
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
+
+
+@ticket_bp.route('/journey', methods=['GET'])
+def plan_journey():
+    """
+    行程规划
+    支持在线路中途站上下车，以及一次换乘的组合方案
+    """
+    date = request.args.get('date')
+    start_city = request.args.get('start_city')
+    end_city = request.args.get('end_city')
+    with_transfer = request.args.get('transfer', '1') != '0'
+    
+    if not date or not start_city or not end_city:
+        return jsonify({'success': False, 'message': '缺少必填字段'}), 400
+    
+    try:
+        origin_ids = resolve_stations(start_city)
+        dest_ids = resolve_stations(end_city)
+        if not origin_ids or not dest_ids:
+            return jsonify({'success': True, 'itineraries': []}), 200
+        
+        planner = JourneyPlanner(get_route_network(), date)
+        itineraries = planner.plan(origin_ids, dest_ids, with_transfer)
         
         return jsonify({
             'success': True,
-            'schedules': results
+            'itineraries': itineraries
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
@@ -134,15 +208,13 @@ def get_schedule_info(schedule_id):
                 v.vehicle_no,
                 v.vehicle_type,
                 v.seat_count,
-                v.seat_count - COALESCE(
-                    (SELECT COUNT(*) FROM Ticket t 
-                     WHERE t.schedule_id = s.schedule_id AND t.status = 'valid'), 0
-                ) AS available_seats
+                v.seat_count - COALESCE(inv.sold_seats, 0) AS available_seats
             FROM Schedule s
             JOIN Route r ON s.route_id = r.route_id
             JOIN Station st_start ON r.start_station_id = st_start.station_id
             JOIN Station st_end ON r.end_station_id = st_end.station_id
             JOIN Vehicle v ON s.vehicle_id = v.vehicle_id
+            LEFT JOIN Schedule_Inventory inv ON inv.schedule_id = s.schedule_id
             WHERE s.schedule_id = %s
         """
         
@@ -169,42 +241,27 @@ def get_schedule_info(schedule_id):
 
 @ticket_bp.route('/schedule/<int:schedule_id>/seats', methods=['GET'])
 def get_available_seats(schedule_id):
-    """获取班次的可用座位"""
+    """
+    获取班次的可用座位（优先使用内存中的座位位图）
+    可通过 from_station_id / to_station_id 查询指定区段的可售座位，缺省为全程
+    """
+    from_station_id = request.args.get('from_station_id', type=int)
+    to_station_id = request.args.get('to_station_id', type=int)
+    
     try:
-        # 获取班次信息
-        schedule = db.execute_query(
-            "SELECT vehicle_id FROM Schedule WHERE schedule_id = %s",
-            (schedule_id,),
-            fetch_one=True
-        )
+        seat_map = SeatMapCache.get(schedule_id)
         
-        if not schedule:
+        if seat_map is None:
             return jsonify({'success': False, 'message': '班次不存在'}), 404
         
-        # 获取该车辆的所有座位
-        sql = """
-            SELECT 
-                s.seat_id,
-                s.seat_no,
-                s.seat_type,
-                s.carriage_no,
-                CASE 
-                    WHEN t.ticket_id IS NOT NULL THEN 'occupied'
-                    ELSE 'available'
-                END AS seat_status
-            FROM Seat s
-            LEFT JOIN Ticket t ON s.seat_id = t.seat_id 
-                AND t.schedule_id = %s 
-                AND t.status = 'valid'
-            WHERE s.vehicle_id = %s
-            ORDER BY s.carriage_no, s.seat_no
-        """
-        
-        seats = db.execute_query(sql, (schedule_id, schedule['vehicle_id']))
+        route = get_route_network().routes.get(seat_map.route_id)
+        segment = route.locate(from_station_id, to_station_id) if route else None
+        if segment is None:
+            return jsonify({'success': False, 'message': '上下车站不在该班次线路上或顺序不正确'}), 400
         
         return jsonify({
             'success': True,
-            'seats': seats
+            'seats': seat_map.to_list(route.segment_mask(*segment))
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
@@ -216,133 +273,77 @@ def book_ticket():
     """
     订票
     支持个人和团体订票
-    支持死锁自动重试机制
+    同步模式下支持死锁自动重试机制；排队模式下返回请求编号，由客户端轮询结果
     """
     data = request.get_json()
     user_id = session['user_id']
     
     schedule_id = data.get('schedule_id')
-    passengers = data.get('passengers')  # [{name, card_id, seat_id}, ...]
+    passengers = data.get('passengers')  # [{name, card_id, seat_id}, ...]，seat_id 可省略由系统分配
+    seat_type = data.get('seat_type')    # 自动选座时的座位类型偏好（可选）
     
     if not schedule_id or not passengers or len(passengers) == 0:
         return jsonify({'success': False, 'message': '缺少必填字段'}), 400
     
-    # 判断是否为团体订票
-    order_type = 'group' if len(passengers) > 1 else 'individual'
+    # 上下车站（可选，缺省为全程）
+    try:
+        schedule_id = int(schedule_id)
+        from_station_id = int(data['from_station_id']) if data.get('from_station_id') else None
+        to_station_id = int(data['to_station_id']) if data.get('to_station_id') else None
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': '班次或上下车站格式不正确'}), 400
     
-    # 使用装饰器包装的订票逻辑，支持死锁自动重试
-    @Database.retry_on_deadlock(max_retries=3)
-    def _do_book_ticket():
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            # 开始事务
-            conn.begin()
-            
-            # 检查提交的乘客列表中是否有重复的身份证号
-            card_ids = [p['card_id'] for p in passengers]
-            if len(card_ids) != len(set(card_ids)):
-                conn.rollback()
-                raise Exception('同一订单中不能包含相同的身份证号')
-            
-            # 检查这些身份证号是否已经在该车次订过票
-            card_placeholders = ','.join(['%s'] * len(card_ids))
-            check_card_sql = f"""
-                SELECT card_id FROM Ticket 
-                WHERE schedule_id = %s 
-                AND card_id IN ({card_placeholders})
-                AND status = 'valid'
-            """
-            cursor.execute(check_card_sql, [schedule_id] + card_ids)
-            existing_cards = cursor.fetchall()
-            
-            if existing_cards:
-                existing_card_list = ', '.join([c['card_id'] for c in existing_cards])
-                conn.rollback()
-                raise Exception(f'身份证号 {existing_card_list} 已在该车次订票，每个身份证号只能订一张票')
-            
-            # 锁定座位（悲观锁）
-            seat_ids = [p['seat_id'] for p in passengers]
-            placeholders = ','.join(['%s'] * len(seat_ids))
-            
-            # 检查座位是否可用
-            check_sql = f"""
-                SELECT seat_id FROM Ticket 
-                WHERE schedule_id = %s 
-                AND seat_id IN ({placeholders})
-                AND status = 'valid'
-                FOR UPDATE
-            """
-            cursor.execute(check_sql, [schedule_id] + seat_ids)
-            occupied_seats = cursor.fetchall()
-            
-            if occupied_seats:
-                conn.rollback()
-                raise Exception('所选座位已被占用')
-            
-            # 获取票价
-            cursor.execute(
-                "SELECT base_price FROM Schedule WHERE schedule_id = %s",
-                (schedule_id,)
-            )
-            schedule = cursor.fetchone()
-            
-            if not schedule:
-                conn.rollback()
-                raise Exception('班次不存在')
-            
-            base_price = float(schedule['base_price'])
-            total_amount = base_price * len(passengers)
-            
-            # 创建订单
-            cursor.execute(
-                """INSERT INTO `Order` (user_id, schedule_id, order_time, total_amount, ticket_count, order_type, status)
-                   VALUES (%s, %s, %s, %s, %s, %s, 'confirmed')""",
-                (user_id, schedule_id, datetime.now(), total_amount, len(passengers), order_type)
-            )
-            order_id = cursor.lastrowid
-            
-            # 创建车票
-            for passenger in passengers:
-                cursor.execute(
-                    """INSERT INTO Ticket (order_id, schedule_id, seat_id, passenger_name, card_id, price, status)
-                       VALUES (%s, %s, %s, %s, %s, %s, 'valid')""",
-                    (order_id, schedule_id, passenger['seat_id'], passenger['name'], 
-                     passenger['card_id'], base_price)
-                )
-        
-            # 提交事务
-            conn.commit()
-            
-            return {
-                'success': True,
-                'message': '订票成功',
-                'order_id': order_id,
-                'total_amount': total_amount
-            }
-            
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            cursor.close()
-            conn.close()
+    booking = BookingRequest(user_id, schedule_id, passengers, from_station_id, to_station_id, seat_type)
     
-    # 执行订票逻辑（带死锁重试）
     try:
-        result = _do_book_ticket()
+        if Config.BOOKING_MODE == 'queued':
+            request_id = BookingQueue.submit(booking)
+            return jsonify({
+                'success': True,
+                'message': '订票请求已提交，正在排队处理',
+                'status': 'pending',
+                'request_id': request_id
+            }), 202
+        
+        # 执行订票逻辑（带死锁重试）
+        result = book(booking)
         return jsonify(result), 201
     except Exception as e:
         return jsonify({'success': False, 'message': f'订票失败: {str(e)}'}), 500
 
 
+@ticket_bp.route('/book/<request_id>', methods=['GET'])
+@require_login
+def get_booking_result(request_id):
+    """
+    查询排队订票结果
+    参数 wait：最多等待的秒数（长轮询），缺省立即返回
+    """
+    wait = min(max(request.args.get('wait', 0, type=float), 0), Config.BOOKING_POLL_MAX_WAIT)
+    
+    found = BookingQueue.get_result(request_id, session['user_id'], wait)
+    if found is None:
+        return jsonify({'success': False, 'message': '订票请求不存在或已过期'}), 404
+    
+    status, result = found
+    if status == 'pending':
+        return jsonify({'success': True, 'status': 'pending', 'request_id': request_id}), 200
+    return jsonify(dict(result, status=status, request_id=request_id)), 200
+
+
 @ticket_bp.route('/my_orders', methods=['GET'])
 @require_login
 def get_my_orders():
-    """获取我的订单"""
+    """
+    获取我的订单
+    按下单时间倒序分页，使用游标（上一页最后一条的 order_time 与 order_id）翻页
+    """
     user_id = session['user_id']
     
+    limit = request.args.get('limit', Config.PER_PAGE, type=int)
+    limit = max(1, min(limit, Config.MAX_PER_PAGE))
+    cursor = request.args.get('cursor')
+    
     sql = """
         SELECT 
             o.order_id,
@@ -364,27 +365,42 @@ def get_my_orders():
         JOIN Station st_start ON r.start_station_id = st_start.station_id
         JOIN Station st_end ON r.end_station_id = st_end.station_id
         WHERE o.user_id = %s
-        ORDER BY o.order_time DESC
     """
+    params = [user_id]
+    
+    if cursor:
+        try:
+            cursor_time, cursor_id = cursor.rsplit(',', 1)
+            cursor_time = datetime.strptime(cursor_time, '%Y-%m-%d %H:%M:%S')
+            cursor_id = int(cursor_id)
+        except ValueError:
+            return jsonify({'success': False, 'message': '分页游标格式不正确'}), 400
+        sql += " AND (o.order_time < %s OR (o.order_time = %s AND o.order_id < %s))"
+        params.extend([cursor_time, cursor_time, cursor_id])
+    
+    # 多取一条用于判断是否还有下一页
+    sql += " ORDER BY o.order_time DESC, o.order_id DESC LIMIT %s"
+    params.append(limit + 1)
     
     try:
-        orders = db.execute_query(sql, (user_id,))
+        orders = db.execute_query(sql, params)
         
-        # 格式化时间
-        for order in orders:
-            if order['order_time']:
-                order['order_time'] = order['order_time'].strftime('%Y-%m-%d %H:%M:%S')
-            if order['departure_date']:
-                order['departure_date'] = order['departure_date'].strftime('%Y-%m-%d')
-            if order['departure_time']:
-                order['departure_time'] = str(order['departure_time'])
-            if order['arrival_time']:
-                order['arrival_time'] = str(order['arrival_time'])
-            
-            # 获取订单的车票详情
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        
+        next_cursor = None
+        if has_more:
+            last_order = orders[-1]
+            next_cursor = f"{last_order['order_time'].strftime('%Y-%m-%d %H:%M:%S')},{last_order['order_id']}"
+        
+        # 一次查询取出本页所有订单的车票，再按订单分组
+        tickets_by_order = {order['order_id']: [] for order in orders}
+        if orders:
+            placeholders = ','.join(['%s'] * len(tickets_by_order))
             tickets = db.execute_query(
-                """SELECT 
+                f"""SELECT 
                     t.ticket_id,
+                    t.order_id,
                     t.passenger_name,
                     t.card_id,
                     t.price,
@@ -394,14 +410,30 @@ def get_my_orders():
                     se.carriage_no
                 FROM Ticket t
                 JOIN Seat se ON t.seat_id = se.seat_id
-                WHERE t.order_id = %s""",
-                (order['order_id'],)
+                WHERE t.order_id IN ({placeholders})
+                ORDER BY t.ticket_id""",
+                list(tickets_by_order)
             )
-            order['tickets'] = tickets
+            for ticket in tickets:
+                tickets_by_order[ticket.pop('order_id')].append(ticket)
+        
+        # 格式化时间
+        for order in orders:
+            if order['order_time']:
+                order['order_time'] = order['order_time'].strftime('%Y-%m-%d %H:%M:%S')
+            if order['departure_date']:
+                order['departure_date'] = order['departure_date'].strftime('%Y-%m-%d')
+            if order['departure_time']:
+                order['departure_time'] = str(order['departure_time'])
+            if order['arrival_time']:
+                order['arrival_time'] = str(order['arrival_time'])
+            
+            order['tickets'] = tickets_by_order[order['order_id']]
         
         return jsonify({
             'success': True,
-            'orders': orders
+            'orders': orders,
+            'next_cursor': next_cursor
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
@@ -432,7 +464,7 @@ def refund_ticket():
             # 验证所有车票都属于该用户
             placeholders = ','.join(['%s'] * len(ticket_ids))
             check_sql = f"""
-                SELECT t.ticket_id, t.order_id, t.price, t.status
+                SELECT t.ticket_id, t.order_id, t.schedule_id, t.seat_id, t.segment_mask, t.price, t.status
                 FROM Ticket t
                 JOIN `Order` o ON t.order_id = o.order_id
                 WHERE t.ticket_id IN ({placeholders})
@@ -452,31 +484,43 @@ def refund_ticket():
                     conn.rollback()
                     raise Exception('部分车票已退票或状态无效')
             
-            # 退票
-            refund_amount = 0
+            # 退票：一条 UPDATE 更新全部车票状态，退票记录合并为一条多行 INSERT
+            locked_ids = [ticket['ticket_id'] for ticket in tickets]
+            cursor.execute(
+                f"UPDATE Ticket SET status = 'refunded' WHERE ticket_id IN ({placeholders})",
+                locked_ids
+            )
+            
+            refund_time = datetime.now()
+            cursor.executemany(
+                """INSERT INTO Refund (ticket_id, refund_time, refund_amount, refund_reason, handled_by)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                [(ticket['ticket_id'], refund_time, ticket['price'], refund_reason, user_id) for ticket in tickets]
+            )
+            SalesRollup.record_refunds(cursor, cursor.lastrowid, refund_time, [ticket['price'] for ticket in tickets])
+            
+            refund_amount = sum(float(ticket['price']) for ticket in tickets)
+            
+            # 释放座位区段占用，并按完全空闲的座位数更新班次库存计数
+            released = {}
             for ticket in tickets:
-                # 更新车票状态
-                cursor.execute(
-                    "UPDATE Ticket SET status = 'refunded' WHERE ticket_id = %s",
-                    (ticket['ticket_id'],)
-                )
-                
-                # 创建退票记录
-                cursor.execute(
-                    """INSERT INTO Refund (ticket_id, refund_time, refund_amount, refund_reason, handled_by)
-                       VALUES (%s, %s, %s, %s, %s)""",
-                    (ticket['ticket_id'], datetime.now(), ticket['price'], refund_reason, user_id)
-                )
-                
-                refund_amount += float(ticket['price'])
+                seat_masks = released.setdefault(ticket['schedule_id'], {})
+                seat_masks[ticket['seat_id']] = seat_masks.get(ticket['seat_id'], 0) | int(ticket['segment_mask'])
+            
+            freed = {}
+            for schedule_id, seat_masks in released.items():
+                freed[schedule_id] = SeatOccupancy.release(cursor, schedule_id, seat_masks)
+            Inventory.decrease_sold(cursor, freed)
             
             # 更新订单状态
             if tickets:
                 order_id = tickets[0]['order_id']
                 cursor.execute(
-                    "SELECT order_id FROM `Order` WHERE order_id = %s FOR UPDATE",
+                    """SELECT order_id, schedule_id, order_time, ticket_count, total_amount, order_type
+                       FROM `Order` WHERE order_id = %s FOR UPDATE""",
                     (order_id,)
                 )
+                order = cursor.fetchone()
                 cursor.execute(
                     """SELECT COUNT(*) as total, 
                        SUM(CASE WHEN status = 'refunded' THEN 1 ELSE 0 END) as refunded_count
@@ -490,9 +534,13 @@ def refund_ticket():
                         "UPDATE `Order` SET status = 'refunded' WHERE order_id = %s",
                         (order_id,)
                     )
+                    SalesRollup.record_order_refunded(cursor, order)
             
             conn.commit()
             
+            for schedule_id, seat_masks in released.items():
+                SeatMapCache.mark_available(schedule_id, seat_masks)
+            
             return {
                 'success': True,
                 'message': '退票成功',
@@ -514,20 +562,38 @@ def refund_ticket():
         return jsonify({'success': False, 'message': f'退票失败: {str(e)}'}), 500
 
 
+def _reference_response(cache_key, field, sql):
+    """
+    返回带ETag的参考数据响应（读穿透缓存）
+    客户端携带匹配的 If-None-Match 时返回 304 Not Modified
+    """
+    def _load():
+        rows = db.execute_query(sql)
+        body = json.dumps(rows, ensure_ascii=False, sort_keys=True, default=str)
+        return rows, hashlib.md5(body.encode('utf-8')).hexdigest()
+    
+    rows, etag = reference_cache.get_or_load(cache_key, _load)
+    
+    response = jsonify({
+        'success': True,
+        field: rows
+    })
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
 @ticket_bp.route('/stations', methods=['GET'])
 def get_stations():
     """获取所有车站列表"""
     try:
-        stations = db.execute_query(
+        return _reference_response(
+            'stations',
+            'stations',
             """SELECT station_id, station_name, city, province, station_type, address
                FROM Station
                ORDER BY province, city, station_name"""
         )
-        
-        return jsonify({
-            'success': True,
-            'stations': stations
-        }), 200
     except Exception as e:
         return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
 
@@ -536,16 +602,12 @@ def get_stations():
 def get_cities():
     """获取所有城市列表"""
     try:
-        cities = db.execute_query(
+        return _reference_response(
+            'cities',
+            'cities',
             """SELECT DISTINCT city, province
                FROM Station
                ORDER BY province, city"""
         )
-        
-        return jsonify({
-            'success': True,
-            'cities': cities
-        }), 200
     except Exception as e:
         return jsonify({'success': False, 'message': f'查询失败: {str(e)}'}), 500
-
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+销售日汇总
+订票/退票事务内同步更新按天汇总的 Daily_Sales、Daily_Refund 和按班次汇总的 Schedule_Sales，
+报表直接读取汇总表，不再对 Order/Refund 全表做 GROUP BY DATE(...)
+
+日汇总表每天拆成 ROLLUP_SLOTS 行（按订单ID/退票ID取模），
+避免当天所有订票事务争用同一行的行锁；报表查询时按日期再求和
+"""
+from datetime import datetime, timedelta
+from app.config import Config
+from app.database import db
+
+
+# 按时间范围从明细表计算日汇总（{where} 为半开区间条件，可走 idx_order_time / idx_refund_time 覆盖索引）
+ORDER_ROLLUP_SQL = """
+    SELECT DATE(order_time), order_id %% %s,
+           SUM(status = 'confirmed'),
+           SUM(status = 'refunded'),
+           SUM(CASE WHEN status = 'confirmed' THEN ticket_count ELSE 0 END),
+           SUM(CASE WHEN status = 'confirmed' THEN total_amount ELSE 0 END),
+           SUM(CASE WHEN status = 'refunded' THEN total_amount ELSE 0 END),
+           SUM(order_type = 'group' AND status = 'confirmed')
+    FROM `Order`
+    WHERE {where} AND status IN ('confirmed', 'refunded')
+    GROUP BY DATE(order_time), order_id %% %s
+"""
+
+REFUND_ROLLUP_SQL = """
+    SELECT DATE(refund_time), refund_id %% %s, COUNT(*), SUM(refund_amount)
+    FROM Refund
+    WHERE {where}
+    GROUP BY DATE(refund_time), refund_id %% %s
+"""
+
+
+def _slot(row_id):
+    return row_id % Config.ROLLUP_SLOTS
+
+
+def date_range(start_date=None, end_date=None):
+    """
+    把报表的起止日期（YYYY-MM-DD，均包含）转换为半开区间 [start, end)
+    查询条件写成 col >= start AND col < end，可直接使用 col 上的索引，
+    也不会漏掉 23:59:59 之后带小数秒的记录
+    :return: (start, end)，未指定的一端为None
+    :raises ValueError: 日期格式不正确或起始日期晚于结束日期
+    """
+    try:
+        start = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+        end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) if end_date else None
+    except ValueError:
+        raise ValueError('日期格式不正确，应为 YYYY-MM-DD')
+    if start and end and start >= end:
+        raise ValueError('开始日期不能晚于结束日期')
+    return start, end
+
+
+def range_condition(column, start, end):
+    """生成半开区间过滤条件和参数"""
+    conditions, params = [], []
+    if start:
+        conditions.append(f"{column} >= %s")
+        params.append(start)
+    if end:
+        conditions.append(f"{column} < %s")
+        params.append(end)
+    return ' AND '.join(conditions) or '1=1', params
+
+
+class SalesRollup:
+    """销售汇总维护（增量更新在调用方的事务内执行）"""
+
+    @staticmethod
+    def record_order(cursor, order_id, schedule_id, order_time, ticket_count, total_amount, order_type):
+        """新订单计入下单日期和班次的汇总"""
+        group_count = 1 if order_type == 'group' else 0
+        cursor.execute(
+            """INSERT INTO Daily_Sales (sale_date, slot, order_count, ticket_count, total_sales, group_order_count)
+               VALUES (%s, %s, 1, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE
+                   order_count = order_count + 1,
+                   ticket_count = ticket_count + VALUES(ticket_count),
+                   total_sales = total_sales + VALUES(total_sales),
+                   group_order_count = group_order_count + VALUES(group_order_count)""",
+            (order_time.date(), _slot(order_id), ticket_count, total_amount, group_count)
+        )
+        cursor.execute(
+            """INSERT INTO Schedule_Sales (schedule_id, order_count, total_revenue)
+               VALUES (%s, 1, %s)
+               ON DUPLICATE KEY UPDATE
+                   order_count = order_count + 1,
+                   total_revenue = total_revenue + VALUES(total_revenue)""",
+            (schedule_id, total_amount)
+        )
+
+    @staticmethod
+    def record_order_refunded(cursor, order):
+        """
+        订单全部退票后，从下单日期的有效订单中转入已退订单
+        :param order: 包含 order_id, schedule_id, order_time, ticket_count, total_amount, order_type 的订单行
+        """
+        group_count = 1 if order['order_type'] == 'group' else 0
+        cursor.execute(
+            """INSERT INTO Daily_Sales (sale_date, slot, order_count, refunded_count, ticket_count,
+                                        total_sales, refunded_amount, group_order_count)
+               VALUES (%s, %s, -1, 1, %s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE
+                   order_count = order_count - 1,
+                   refunded_count = refunded_count + 1,
+                   ticket_count = ticket_count + VALUES(ticket_count),
+                   total_sales = total_sales + VALUES(total_sales),
+                   refunded_amount = refunded_amount + VALUES(refunded_amount),
+                   group_order_count = group_order_count + VALUES(group_order_count)""",
+            (order['order_time'].date(), _slot(order['order_id']), -order['ticket_count'],
+             -order['total_amount'], order['total_amount'], -group_count)
+        )
+        cursor.execute(
+            """INSERT INTO Schedule_Sales (schedule_id, order_count, refunded_order_count, total_revenue)
+               VALUES (%s, -1, 1, %s)
+               ON DUPLICATE KEY UPDATE
+                   order_count = order_count - 1,
+                   refunded_order_count = refunded_order_count + 1,
+                   total_revenue = total_revenue + VALUES(total_revenue)""",
+            (order['schedule_id'], -order['total_amount'])
+        )
+
+    @staticmethod
+    def record_refunds(cursor, first_refund_id, refund_time, amounts):
+        """
+        退票记录计入退票日期的汇总
+        :param first_refund_id: 本次写入的第一条退票记录ID（用于选择汇总槽位）
+        :param amounts: 每张车票的退款金额
+        """
+        cursor.execute(
+            """INSERT INTO Daily_Refund (refund_date, slot, refund_count, total_refund_amount)
+               VALUES (%s, %s, %s, %s)
+               ON DUPLICATE KEY UPDATE
+                   refund_count = refund_count + VALUES(refund_count),
+                   total_refund_amount = total_refund_amount + VALUES(total_refund_amount)""",
+            (refund_time.date(), _slot(first_refund_id), len(amounts), sum(amounts))
+        )
+
+    @staticmethod
+    def rebuild(start=None, end=None):
+        """
+        根据 Order 和 Refund 表重建汇总（用于初始化历史数据或校准）
+        指定 [start, end) 时只重建该时间段的日汇总，按 order_time/refund_time 范围扫描索引；
+        未指定时重建全部汇总（包括班次销售汇总）
+        :return: 重建后的销售日汇总行数
+        """
+        slots = Config.ROLLUP_SLOTS
+        order_where, order_params = range_condition('order_time', start, end)
+        refund_where, refund_params = range_condition('refund_time', start, end)
+        start_day, end_day = start and start.date(), end and end.date()
+        sale_where, sale_params = range_condition('sale_date', start_day, end_day)
+        refund_date_where, refund_date_params = range_condition('refund_date', start_day, end_day)
+
+        with db.get_cursor() as cursor:
+            cursor.execute(f"DELETE FROM Daily_Sales WHERE {sale_where}", sale_params)
+            cursor.execute(f"DELETE FROM Daily_Refund WHERE {refund_date_where}", refund_date_params)
+            affected = cursor.execute(
+                "INSERT INTO Daily_Sales (sale_date, slot, order_count, refunded_count, ticket_count, "
+                "total_sales, refunded_amount, group_order_count) " + ORDER_ROLLUP_SQL.format(where=order_where),
+                [slots] + order_params + [slots]
+            )
+            cursor.execute(
+                "INSERT INTO Daily_Refund (refund_date, slot, refund_count, total_refund_amount) "
+                + REFUND_ROLLUP_SQL.format(where=refund_where),
+                [slots] + refund_params + [slots]
+            )
+            if start is None and end is None:
+                cursor.execute("DELETE FROM Schedule_Sales")
+                cursor.execute(
+                    """INSERT INTO Schedule_Sales (schedule_id, order_count, refunded_order_count, total_revenue)
+                       SELECT schedule_id,
+                              SUM(status = 'confirmed'),
+                              SUM(status = 'refunded'),
+                              SUM(CASE WHEN status = 'confirmed' THEN total_amount ELSE 0 END)
+                       FROM `Order`
+                       GROUP BY schedule_id"""
+                )
+            return affected
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+班次座位占用位图
+每个班次一张位图，每个座位对应一个64位的区段掩码（按 carriage_no, seat_no 排序），
+第i位表示该座位第i站到第i+1站的区段已售，查询某区段是否可售只需一次位与运算。
+首次访问时从数据库加载，订票/退票成功后同步更新，
+座位图查询在命中缓存时不访问数据库
+"""
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from app.config import Config
+from app.database import db
+
+
+class SeatMap:
+    """单个班次的座位区段占用位图"""
+
+    __slots__ = ('route_id', 'seats', 'positions', 'masks', 'loaded_at')
+
+    def __init__(self, route_id, seats, seat_masks):
+        """
+        :param seats: 座位静态信息（只读），顺序即位图中的位序
+        :param seat_masks: {seat_id: 已占用区段位掩码}
+        """
+        self.route_id = route_id
+        self.seats = seats
+        self.positions = {seat['seat_id']: index for index, seat in enumerate(seats)}
+        self.masks = array('Q', bytes(8 * len(seats)))
+        self.loaded_at = time.time()
+        for seat_id, segment_mask in seat_masks.items():
+            position = self.positions.get(seat_id)
+            if position is not None:
+                self.masks[position] = segment_mask
+
+    def is_occupied(self, position, segment_mask):
+        return bool(self.masks[position] & segment_mask)
+
+    def occupy(self, seat_ids, segment_mask):
+        """标记座位的区段已占用，忽略不属于该车辆的座位"""
+        for seat_id in seat_ids:
+            position = self.positions.get(seat_id)
+            if position is not None:
+                self.masks[position] |= segment_mask
+
+    def release(self, seat_masks):
+        """释放座位的区段占用 {seat_id: 区段位掩码}"""
+        for seat_id, segment_mask in seat_masks.items():
+            position = self.positions.get(seat_id)
+            if position is not None:
+                self.masks[position] &= ~segment_mask & 0xFFFFFFFFFFFFFFFF
+
+    def available_count(self, segment_mask):
+        return sum(1 for mask in self.masks if not mask & segment_mask)
+
+    def pick_seats(self, count, segment_mask, seat_type=None, exclude=()):
+        """
+        自动选座
+        优先选择同一车厢内连续的空闲座位，其次同一车厢内不连续的座位，最后跨车厢补足；
+        多个车厢都满足条件时随机选择，降低并发团体订票争抢同一批座位的概率
+        :return: 座位ID列表，余座不足时返回None
+        """
+        carriages = OrderedDict()  # 车厢号 -> 空闲座位下标（有序）
+        for position, seat in enumerate(self.seats):
+            if self.masks[position] & segment_mask or seat['seat_id'] in exclude:
+                continue
+            if seat_type and seat['seat_type'] != seat_type:
+                continue
+            carriages.setdefault(seat['carriage_no'], []).append(position)
+
+        if sum(len(positions) for positions in carriages.values()) < count:
+            return None
+        if count == 0:
+            return []
+
+        runs = []
+        for positions in carriages.values():
+            run_start = 0
+            for index in range(len(positions)):
+                if index > 0 and positions[index] != positions[index - 1] + 1:
+                    run_start = index
+                if index - run_start + 1 == count:
+                    runs.append(positions[run_start:index + 1])
+                    break
+
+        if runs:
+            chosen = random.choice(runs)
+        else:
+            fitting = [positions for positions in carriages.values() if len(positions) >= count]
+            if fitting:
+                chosen = random.choice(fitting)[:count]
+            else:
+                ordered = sorted(carriages.values(), key=len, reverse=True)
+                chosen = [position for positions in ordered for position in positions][:count]
+        return [self.seats[position]['seat_id'] for position in chosen]
+
+    def to_list(self, segment_mask):
+        """转换为座位图接口的返回格式（按指定区段判断是否可售）"""
+        result = []
+        for position, seat in enumerate(self.seats):
+            item = dict(seat)
+            item['seat_status'] = 'occupied' if self.is_occupied(position, segment_mask) else 'available'
+            result.append(item)
+        return result
+
+
+class SeatMapCache:
+    """进程内的班次座位位图缓存（LRU淘汰 + TTL过期）"""
+
+    _maps = OrderedDict()
+    # 每个班次的变更版本号，用于丢弃加载期间已过时的位图
+    _versions = {}
+    _epoch = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, schedule_id):
+        """
+        获取班次的座位位图，未缓存或已过期时从数据库加载
+        :return: SeatMap对象，班次不存在时返回None
+        """
+        with cls._lock:
+            seat_map = cls._maps.get(schedule_id)
+            if seat_map is not None:
+                if time.time() - seat_map.loaded_at < Config.SEAT_MAP_TTL:
+                    cls._maps.move_to_end(schedule_id)
+                    return seat_map
+                del cls._maps[schedule_id]
+            version = (cls._epoch, cls._versions.get(schedule_id, 0))
+
+        seat_map = cls._load(schedule_id)
+        if seat_map is None:
+            return None
+
+        with cls._lock:
+            # 加载期间有订票/退票发生，则本次结果不放入缓存
+            if (cls._epoch, cls._versions.get(schedule_id, 0)) == version:
+                cls._maps[schedule_id] = seat_map
+                cls._maps.move_to_end(schedule_id)
+                while len(cls._maps) > Config.SEAT_MAP_MAX_SCHEDULES:
+                    cls._maps.popitem(last=False)
+        return seat_map
+
+    @classmethod
+    def mark_occupied(cls, schedule_id, seat_ids, segment_mask, seat_map=None):
+        """
+        订票成功后标记座位区段已占用
+        :param seat_map: 调用方持有的位图（可能未放入缓存），一并更新
+        """
+        cls._update(schedule_id, lambda target: target.occupy(seat_ids, segment_mask), seat_map)
+
+    @classmethod
+    def mark_available(cls, schedule_id, seat_masks):
+        """退票成功后释放座位区段 {seat_id: 区段位掩码}"""
+        cls._update(schedule_id, lambda seat_map: seat_map.release(seat_masks))
+
+    @classmethod
+    def invalidate(cls, schedule_id=None):
+        """使位图失效，schedule_id为空时清空全部"""
+        with cls._lock:
+            if schedule_id is None:
+                cls._maps.clear()
+                cls._epoch += 1
+            else:
+                cls._maps.pop(schedule_id, None)
+                cls._versions[schedule_id] = cls._versions.get(schedule_id, 0) + 1
+
+    @classmethod
+    def _update(cls, schedule_id, apply, extra=None):
+        with cls._lock:
+            cls._versions[schedule_id] = cls._versions.get(schedule_id, 0) + 1
+            seat_map = cls._maps.get(schedule_id)
+            if seat_map is not None:
+                apply(seat_map)
+            if extra is not None and extra is not seat_map:
+                apply(extra)
+
+    @staticmethod
+    def _load(schedule_id):
+        """从数据库加载班次的座位及占用情况"""
+        schedule = db.execute_query(
+            "SELECT vehicle_id, route_id FROM Schedule WHERE schedule_id = %s",
+            (schedule_id,),
+            fetch_one=True
+        )
+        if not schedule:
+            return None
+
+        seats = db.execute_query(
+            """SELECT seat_id, seat_no, seat_type, carriage_no
+               FROM Seat
+               WHERE vehicle_id = %s
+               ORDER BY carriage_no, seat_no""",
+            (schedule['vehicle_id'],)
+        )
+        occupied = db.execute_query(
+            "SELECT seat_id, segment_mask FROM Seat_Occupancy WHERE schedule_id = %s AND segment_mask != 0",
+            (schedule_id,)
+        )
+        return SeatMap(
+            schedule['route_id'],
+            seats,
+            {row['seat_id']: int(row['segment_mask']) for row in occupied}
+        )
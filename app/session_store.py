@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+服务端会话存储
+会话保存在进程内的 TTL 映射中，登录和每个请求的令牌校验只读写内存：
+    - 登录时生成会话，Session 表的写入（以及登出时的删除）先进入待写队列，
+      由后台线程定期批量写入（SESSION_WRITE_BEHIND=0 时同步写入）
+    - 每个请求校验 Flask session 中的令牌，内存中没有的令牌（如其他进程登录、服务重启）
+      回查 Session 表；已缓存的会话每隔 SESSION_CACHE_TTL 秒回查一次，使其他进程的登出生效
+    - 后台线程按 idx_expire_time 分批删除过期会话
+"""
+import atexit
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import session
+from app.config import Config
+from app.database import db
+
+INSERT_SESSION_SQL = """INSERT IGNORE INTO Session (session_id, user_id, login_time, expire_time, token, device_info)
+                        VALUES (%s, %s, %s, %s, %s, %s)"""
+
+
+class _SessionEntry:
+    """缓存的会话"""
+
+    __slots__ = ('session_id', 'token', 'user_id', 'login_time', 'expire_time', 'device_info',
+                 'persisted', 'checked_at')
+
+    def __init__(self, session_id, token, user_id, login_time, expire_time, device_info, persisted):
+        self.session_id = session_id
+        self.token = token
+        self.user_id = user_id
+        self.login_time = login_time
+        self.expire_time = expire_time
+        self.device_info = device_info
+        self.persisted = persisted   # 是否已写入 Session 表
+        self.checked_at = time.time()
+
+    def params(self):
+        return (self.session_id, self.user_id, self.login_time, self.expire_time, self.token, self.device_info)
+
+
+class SessionStore:
+    """会话存储（进程内单例）"""
+
+    _sessions = {}          # token -> _SessionEntry
+    _pending_inserts = {}   # token -> _SessionEntry，尚未写入 Session 表
+    _pending_deletes = set()
+    _lock = threading.Lock()
+    _worker = None
+    _last_sweep = 0.0
+    _swept_rows = 0
+
+    @classmethod
+    def _ensure_started(cls):
+        """首次使用时启动后台线程（调用方持有 _lock）"""
+        if cls._worker is None:
+            cls._worker = threading.Thread(target=cls._run, name='session-store', daemon=True)
+            cls._worker.start()
+            atexit.register(cls.flush)
+
+    @classmethod
+    def create(cls, user_id, device_info=None):
+        """
+        创建会话
+        :return: 会话令牌
+        """
+        login_time = datetime.now()
+        entry = _SessionEntry(
+            secrets.token_hex(32), secrets.token_hex(64), user_id, login_time,
+            login_time + timedelta(seconds=Config.SESSION_TIMEOUT),
+            (device_info or '')[:200], persisted=not Config.SESSION_WRITE_BEHIND
+        )
+        if not Config.SESSION_WRITE_BEHIND:
+            db.execute_insert(INSERT_SESSION_SQL, entry.params())
+
+        with cls._lock:
+            cls._ensure_started()
+            cls._sessions[entry.token] = entry
+            if not entry.persisted:
+                cls._pending_inserts[entry.token] = entry
+        return entry.token
+
+    @classmethod
+    def validate(cls, token, issued_at=None):
+        """
+        校验令牌
+        :param issued_at: 令牌签发时间（time.time()），刚登录的会话在其他进程中可能尚未写入 Session 表，
+                          签发后 SESSION_WRITE_GRACE 秒内回查不到时仍视为有效
+        :return: 会话是否有效
+        """
+        now = datetime.now()
+        with cls._lock:
+            cls._ensure_started()
+            entry = cls._sessions.get(token)
+            if entry is not None:
+                if entry.expire_time <= now:
+                    cls._drop(token)
+                    return False
+                if not entry.persisted or time.time() - entry.checked_at < Config.SESSION_CACHE_TTL:
+                    return True
+
+        row = db.execute_query(
+            """SELECT session_id, user_id, login_time, expire_time, device_info
+               FROM Session WHERE token = %s AND expire_time > %s""",
+            (token, now),
+            fetch_one=True
+        )
+        with cls._lock:
+            if row is None:
+                cls._sessions.pop(token, None)
+                return issued_at is not None and time.time() - issued_at < Config.SESSION_WRITE_GRACE
+            cls._sessions[token] = _SessionEntry(
+                row['session_id'], token, row['user_id'], row['login_time'],
+                row['expire_time'], row['device_info'], persisted=True
+            )
+        return True
+
+    @classmethod
+    def revoke(cls, token):
+        """登出：移除会话"""
+        with cls._lock:
+            cls._sessions.pop(token, None)
+            if cls._pending_inserts.pop(token, None) is not None:
+                return   # 尚未写入 Session 表，无需删除
+            if Config.SESSION_WRITE_BEHIND:
+                cls._pending_deletes.add(token)
+                return
+        db.execute_update("DELETE FROM Session WHERE token = %s", (token,))
+
+    @classmethod
+    def _drop(cls, token):
+        """移除过期会话（调用方持有 _lock），表中的记录由清理任务删除"""
+        cls._sessions.pop(token, None)
+        cls._pending_inserts.pop(token, None)
+
+    @classmethod
+    def flush(cls):
+        """把待写入的会话和待删除的令牌在一个事务中写入 Session 表"""
+        with cls._lock:
+            inserts = list(cls._pending_inserts.values())
+            deletes = list(cls._pending_deletes)
+            cls._pending_inserts = {}
+            cls._pending_deletes = set()
+        if not inserts and not deletes:
+            return
+
+        sql_list = [(INSERT_SESSION_SQL, entry.params()) for entry in inserts]
+        for i in range(0, len(deletes), Config.SESSION_SWEEP_BATCH):
+            chunk = deletes[i:i + Config.SESSION_SWEEP_BATCH]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            sql_list.append((f"DELETE FROM Session WHERE token IN ({placeholders})", chunk))
+        try:
+            db.execute_batch(sql_list)
+        except Exception as e:
+            print(f"会话写入失败，稍后重试: {str(e)}")
+            with cls._lock:
+                for entry in inserts:
+                    if entry.token in cls._sessions:
+                        cls._pending_inserts.setdefault(entry.token, entry)
+                cls._pending_deletes.update(deletes)
+            return
+
+        with cls._lock:
+            for entry in inserts:
+                entry.persisted = True
+                entry.checked_at = time.time()
+
+    @classmethod
+    def sweep(cls):
+        """
+        清理过期会话：内存中直接移除，表中按 expire_time 范围分批删除（走 idx_expire_time），
+        每批单独提交，避免长时间持有锁
+        :return: 删除的行数
+        """
+        now = datetime.now()
+        with cls._lock:
+            for token in [token for token, entry in cls._sessions.items() if entry.expire_time <= now]:
+                cls._drop(token)
+
+        deleted = 0
+        while True:
+            affected = db.execute_update(
+                "DELETE FROM Session WHERE expire_time <= %s ORDER BY expire_time LIMIT %s",
+                (now, Config.SESSION_SWEEP_BATCH)
+            )
+            deleted += affected
+            if affected < Config.SESSION_SWEEP_BATCH:
+                break
+        with cls._lock:
+            cls._last_sweep = time.time()
+            cls._swept_rows += deleted
+        return deleted
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            return {
+                'cached_sessions': len(cls._sessions),
+                'pending_inserts': len(cls._pending_inserts),
+                'pending_deletes': len(cls._pending_deletes),
+                'write_behind': Config.SESSION_WRITE_BEHIND,
+                'last_sweep': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(cls._last_sweep))
+                if cls._last_sweep else None,
+                'swept_rows': cls._swept_rows
+            }
+
+    @classmethod
+    def _run(cls):
+        """后台线程：定期批量写入，并按间隔清理过期会话"""
+        while True:
+            time.sleep(Config.SESSION_FLUSH_INTERVAL)
+            try:
+                cls.flush()
+                if time.time() - cls._last_sweep >= Config.SESSION_SWEEP_INTERVAL:
+                    cls.sweep()
+            except Exception as e:
+                print(f"会话清理失败: {str(e)}")
+
+
+def init_app(app):
+    """每个请求校验 Flask session 中的令牌，会话已失效时清除登录状态"""
+
+    @app.before_request
+    def _validate_session():
+        token = session.get('token')
+        if token and not SessionStore.validate(token, session.get('issued_at')):
+            session.clear()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+车站名称索引
+把用户输入的城市/车站名解析为车站ID集合，
+查询班次时按 r.start_station_id IN (...) 过滤，避免 LIKE '%城市%' 全表扫描
+匹配顺序：城市精确匹配 -> 城市/车站名/拼音前缀匹配
+"""
+from bisect import bisect_left
+from pypinyin import lazy_pinyin, Style
+from app.cache import reference_cache
+from app.database import db
+
+
+def normalize(text):
+    """规范化输入：去除空白、转小写、去掉末尾的“市”"""
+    text = ''.join((text or '').split()).lower()
+    if len(text) > 1 and text.endswith('市'):
+        text = text[:-1]
+    return text
+
+
+def pinyin_keys(text):
+    """生成全拼和首字母两种拼音键"""
+    if not text:
+        return []
+    full = ''.join(lazy_pinyin(text))
+    initials = ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER))
+    return [full, initials]
+
+
+class StationIndex:
+    """内存中的车站名称索引（构建后只读）"""
+
+    def __init__(self, stations):
+        self.city_ids = {}   # 规范化城市名 -> 车站ID集合
+        prefix_entries = set()
+        for station in stations:
+            station_id = station['station_id']
+            city = normalize(station['city'])
+            self.city_ids.setdefault(city, set()).add(station_id)
+            keys = [city, normalize(station['station_name'])]
+            keys += pinyin_keys(city) + pinyin_keys(station['station_name'])
+            for key in keys:
+                if key:
+                    prefix_entries.add((key, station_id))
+        # 按键排序，前缀查询使用二分查找
+        self.prefix_entries = sorted(prefix_entries)
+
+    def resolve(self, text):
+        """
+        解析城市/车站输入
+        :return: 匹配的车站ID集合，无匹配时返回空集合
+        """
+        key = normalize(text)
+        if not key:
+            return set()
+
+        station_ids = self.city_ids.get(key)
+        if station_ids:
+            return set(station_ids)
+
+        result = set()
+        index = bisect_left(self.prefix_entries, (key,))
+        while index < len(self.prefix_entries):
+            entry_key, station_id = self.prefix_entries[index]
+            if not entry_key.startswith(key):
+                break
+            result.add(station_id)
+            index += 1
+        return result
+
+
+def _load_station_index():
+    stations = db.execute_query(
+        "SELECT station_id, station_name, city FROM Station"
+    )
+    return StationIndex(stations)
+
+
+def resolve_stations(text):
+    """把城市/车站输入解析为车站ID集合（索引随车站参考数据缓存一起失效）"""
+    return reference_cache.get_or_load('station_index', _load_station_index).resolve(text)
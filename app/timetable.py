@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+时刻表批量生成
+把循环班次模板（班次号、线路、车辆、时刻、开行星期、日期范围）展开为班次行，
+在内存中按 uk_schedule_date (schedule_no, departure_date) 校验重复后分块写入
+"""
+from datetime import datetime, timedelta
+from app.config import Config
+from app.database import db
+
+TEMPLATE_FIELDS = ('schedule_no', 'route_id', 'vehicle_id', 'departure_time', 'arrival_time', 'base_price')
+
+INSERT_SQL = """INSERT INTO Schedule (schedule_no, route_id, vehicle_id, departure_date,
+                                      departure_time, arrival_time, base_price, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
+
+
+def _parse_date(value, field):
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'{field} 日期格式不正确，应为 YYYY-MM-DD')
+
+
+def _parse_time(value, field):
+    """解析 HH:MM 或 HH:MM:SS，返回 HH:MM:SS 字符串"""
+    value = str(value)
+    try:
+        parsed = datetime.strptime(value, '%H:%M:%S' if value.count(':') == 2 else '%H:%M')
+    except ValueError:
+        raise ValueError(f'{field} 时间格式不正确，应为 HH:MM')
+    return parsed.strftime('%H:%M:%S')
+
+
+def _parse_weekdays(value):
+    """开行星期：1-7 分别表示周一到周日，缺省为每天"""
+    if value is None:
+        return set(range(1, 8))
+    try:
+        weekdays = {int(day) for day in value}
+    except (ValueError, TypeError):
+        raise ValueError('开行星期格式不正确，应为 1-7 的数组')
+    if not weekdays or not weekdays <= set(range(1, 8)):
+        raise ValueError('开行星期格式不正确，应为 1-7 的数组')
+    return weekdays
+
+
+def expand_templates(data):
+    """
+    展开班次模板
+    data 中可以直接给出单个模板的字段，也可以通过 templates 给出多个模板；
+    start_date、end_date、weekdays、status 为所有模板共用的缺省值
+    :return: 班次行列表 [(schedule_no, route_id, vehicle_id, departure_date, departure_time, arrival_time, base_price, status), ...]
+    """
+    templates = data.get('templates') or [data]
+    rows = []
+    seen = set()
+
+    for index, template in enumerate(templates, start=1):
+        template = dict(data, **template) if template is not data else template
+        missing = [field for field in TEMPLATE_FIELDS + ('start_date', 'end_date') if template.get(field) in (None, '')]
+        if missing:
+            raise ValueError(f"第{index}个模板缺少字段: {', '.join(missing)}")
+
+        start_date = _parse_date(template['start_date'], 'start_date')
+        end_date = _parse_date(template['end_date'], 'end_date')
+        if end_date < start_date:
+            raise ValueError(f'第{index}个模板的结束日期早于开始日期')
+        if (end_date - start_date).days >= Config.TIMETABLE_MAX_DAYS:
+            raise ValueError(f'日期范围不能超过{Config.TIMETABLE_MAX_DAYS}天')
+
+        departure_time = _parse_time(template['departure_time'], 'departure_time')
+        arrival_time = _parse_time(template['arrival_time'], 'arrival_time')
+        if departure_time == arrival_time:
+            # 到达时间早于发车时间表示次日到达
+            raise ValueError(f'第{index}个模板的到达时间不能等于发车时间')
+
+        try:
+            route_id = int(template['route_id'])
+            vehicle_id = int(template['vehicle_id'])
+            base_price = float(template['base_price'])
+        except (ValueError, TypeError):
+            raise ValueError(f'第{index}个模板的线路、车辆或票价格式不正确')
+        if base_price < 0:
+            raise ValueError('票价不能为负数')
+
+        status = template.get('status', 'normal')
+        if status not in ('normal', 'delayed', 'cancelled'):
+            raise ValueError('班次状态不正确')
+
+        schedule_no = str(template['schedule_no'])
+        weekdays = _parse_weekdays(template.get('weekdays'))
+
+        day = start_date
+        while day <= end_date:
+            if day.isoweekday() in weekdays:
+                key = (schedule_no, day)
+                if key in seen:
+                    raise ValueError(f'班次 {schedule_no} 在 {day} 重复')
+                seen.add(key)
+                rows.append((schedule_no, route_id, vehicle_id, day, departure_time, arrival_time, base_price, status))
+            day += timedelta(days=1)
+
+        if len(rows) > Config.TIMETABLE_MAX_ROWS:
+            raise ValueError(f'一次最多生成{Config.TIMETABLE_MAX_ROWS}个班次')
+
+    return rows
+
+
+def find_missing_references(rows):
+    """检查模板引用的线路和车辆是否存在，返回错误信息（没有错误时返回None）"""
+    for table, column, values in (
+        ('Route', 'route_id', {row[1] for row in rows}),
+        ('Vehicle', 'vehicle_id', {row[2] for row in rows}),
+    ):
+        if not values:
+            continue
+        placeholders = ','.join(['%s'] * len(values))
+        existing = {
+            row[column] for row in db.execute_query(
+                f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders})", list(values)
+            )
+        }
+        missing = sorted(values - existing)
+        if missing:
+            return f"{column} 不存在: {', '.join(str(value) for value in missing)}"
+    return None
+
+
+def find_existing(rows):
+    """
+    查询待生成班次中已存在的 (schedule_no, departure_date)
+    按班次号分块，每块用一条范围查询取出已有日期，再与待生成的日期求交集
+    """
+    dates_by_no = {}
+    for row in rows:
+        dates_by_no.setdefault(row[0], []).append(row[3])
+
+    existing = set()
+    schedule_nos = list(dates_by_no)
+    for offset in range(0, len(schedule_nos), Config.BULK_CHUNK_SIZE):
+        chunk = schedule_nos[offset:offset + Config.BULK_CHUNK_SIZE]
+        all_dates = [day for schedule_no in chunk for day in dates_by_no[schedule_no]]
+        placeholders = ','.join(['%s'] * len(chunk))
+        for row in db.execute_query(
+            f"""SELECT schedule_no, departure_date FROM Schedule
+                WHERE schedule_no IN ({placeholders})
+                AND departure_date BETWEEN %s AND %s""",
+            chunk + [min(all_dates), max(all_dates)]
+        ):
+            existing.add((row['schedule_no'], row['departure_date']))
+    return existing & {(row[0], row[3]) for row in rows}
+
+
+def insert_schedules(rows, chunk_size=None):
+    """分块写入班次（每个分块一条多行 INSERT、单独提交）"""
+    return db.execute_bulk([(INSERT_SQL, row) for row in rows], chunk_size)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+团体订票/退票写入性能测试：逐行语句 vs 多行 INSERT / UPDATE ... IN
+
+在事务中先锁定班次库存行（与订票时持有的行锁相同），
+计时从取得锁到写完车票/退票记录为止，即锁持有期间的语句耗时；每轮结束后回滚，不留下数据
+
+用法（在项目根目录执行）：
+    python -m scripts.bench_group_booking --schedule-id 1
+    python -m scripts.bench_group_booking --schedule-id 1 --sizes 10 20 50 --rounds 30
+"""
+import argparse
+import time
+from datetime import datetime
+from app.database import Database
+
+TICKET_SQL = """INSERT INTO Ticket (order_id, schedule_id, seat_id, passenger_name, card_id, price,
+                                    from_station_id, to_station_id, segment_mask, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+REFUND_SQL = """INSERT INTO Refund (ticket_id, refund_time, refund_amount, refund_reason, handled_by)
+                VALUES (%s, %s, %s, %s, %s)"""
+
+
+def write_rows(cursor, rows, batched):
+    """写入车票、更新为已退票并写入退票记录，返回 (订票阶段耗时, 退票阶段耗时)"""
+    start = time.perf_counter()
+    if batched:
+        cursor.executemany(TICKET_SQL, rows)
+        first_id = cursor.lastrowid
+        ticket_ids = list(range(first_id, first_id + len(rows)))
+    else:
+        ticket_ids = []
+        for row in rows:
+            cursor.execute(TICKET_SQL, row)
+            ticket_ids.append(cursor.lastrowid)
+    booked = time.perf_counter()
+
+    now = datetime.now()
+    refunds = [(ticket_id, now, 100, 'bench', None) for ticket_id in ticket_ids]
+    if batched:
+        placeholders = ','.join(['%s'] * len(ticket_ids))
+        cursor.execute(f"UPDATE Ticket SET status = 'refunded' WHERE ticket_id IN ({placeholders})", ticket_ids)
+        cursor.executemany(REFUND_SQL, refunds)
+    else:
+        for ticket_id, refund in zip(ticket_ids, refunds):
+            cursor.execute("UPDATE Ticket SET status = 'refunded' WHERE ticket_id = %s", (ticket_id,))
+            cursor.execute(REFUND_SQL, refund)
+    return booked - start, time.perf_counter() - booked
+
+
+def run_round(schedule, seats, size, batched):
+    conn = Database.get_connection()
+    cursor = conn.cursor()
+    try:
+        conn.begin()
+        cursor.execute(
+            "SELECT sold_seats FROM Schedule_Inventory WHERE schedule_id = %s FOR UPDATE",
+            (schedule['schedule_id'],)
+        )
+        cursor.execute(
+            """INSERT INTO `Order` (user_id, schedule_id, order_time, total_amount, ticket_count, order_type, status)
+               VALUES (%s, %s, %s, %s, %s, 'group', 'confirmed')""",
+            (schedule['user_id'], schedule['schedule_id'], datetime.now(), 100 * size, size)
+        )
+        order_id = cursor.lastrowid
+        rows = [
+            (order_id, schedule['schedule_id'], seats[i % len(seats)], f'压测{i}', f'BENCH{i:013d}', 100,
+             schedule['start_station_id'], schedule['end_station_id'], 1, 'valid')
+            for i in range(size)
+        ]
+        return write_rows(cursor, rows, batched)
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='团体订票/退票写入性能测试')
+    parser.add_argument('--schedule-id', type=int, required=True)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 20, 30, 50], help='每单乘客数')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    schedule = Database.execute_query(
+        """SELECT s.schedule_id, s.vehicle_id, r.start_station_id, r.end_station_id
+           FROM Schedule s JOIN Route r ON s.route_id = r.route_id
+           WHERE s.schedule_id = %s""",
+        (args.schedule_id,), fetch_one=True
+    )
+    if not schedule:
+        print("班次不存在")
+        return
+    schedule['user_id'] = Database.execute_query(
+        "SELECT user_id FROM User ORDER BY user_id LIMIT 1", fetch_one=True
+    )['user_id']
+    seats = [row['seat_id'] for row in Database.execute_query(
+        "SELECT seat_id FROM Seat WHERE vehicle_id = %s", (schedule['vehicle_id'],)
+    )]
+    # 保证库存行存在，用于模拟订票时持有的行锁
+    Database.execute_update(
+        "INSERT IGNORE INTO Schedule_Inventory (schedule_id, sold_seats) VALUES (%s, 0)",
+        (args.schedule_id,)
+    )
+
+    print(f"{'乘客数':>6} {'方式':<6} {'订票写入(ms)':>12} {'退票写入(ms)':>12} {'合计(ms)':>10}")
+    for size in args.sizes:
+        for name, batched in (('逐行', False), ('多行', True)):
+            book_total = refund_total = 0
+            for _ in range(args.rounds):
+                book_time, refund_time = run_round(schedule, seats, size, batched)
+                book_total += book_time
+                refund_total += refund_time
+            book_ms = book_total * 1000 / args.rounds
+            refund_ms = refund_total * 1000 / args.rounds
+            print(f"{size:>6} {name:<6} {book_ms:>12.2f} {refund_ms:>12.2f} {book_ms + refund_ms:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+班次查询性能测试：LIKE '%城市%' 过滤 vs 车站ID IN (...) 过滤
+
+用法（在项目根目录执行）：
+    python -m scripts.bench_search --seed 200000     # 生成测试班次
+    python -m scripts.bench_search                   # 对比两种查询
+    python -m scripts.bench_search --cleanup         # 删除测试班次
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from app.database import Database
+from app.station_index import StationIndex
+
+BENCH_PREFIX = 'BENCH'
+
+BASE_SQL = """
+    SELECT s.schedule_id, s.schedule_no, s.departure_time, v.seat_count
+    FROM Schedule s
+    JOIN Route r ON s.route_id = r.route_id
+    JOIN Station st_start ON r.start_station_id = st_start.station_id
+    JOIN Station st_end ON r.end_station_id = st_end.station_id
+    JOIN Vehicle v ON s.vehicle_id = v.vehicle_id
+    WHERE s.departure_date = %s
+"""
+
+
+def seed(count, days):
+    """按天循环生成测试班次（复用已有线路与车辆）"""
+    routes = Database.execute_query("SELECT route_id FROM Route")
+    vehicles = Database.execute_query("SELECT vehicle_id FROM Vehicle")
+    rows = []
+    for i in range(count):
+        rows.append((
+            f"{BENCH_PREFIX}{i // days}",
+            routes[i % len(routes)]['route_id'],
+            vehicles[i % len(vehicles)]['vehicle_id'],
+            date.today() + timedelta(days=i % days),
+            '08:00:00', '12:00:00', 100
+        ))
+    with Database.get_cursor() as cursor:
+        for start in range(0, len(rows), 1000):
+            cursor.executemany(
+                """INSERT INTO Schedule (schedule_no, route_id, vehicle_id, departure_date,
+                                         departure_time, arrival_time, base_price)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                rows[start:start + 1000]
+            )
+    print(f"已生成 {count} 条测试班次")
+
+
+def cleanup():
+    affected = Database.execute_update(
+        "DELETE FROM Schedule WHERE schedule_no LIKE %s", (f"{BENCH_PREFIX}%",)
+    )
+    print(f"已删除 {affected} 条测试班次")
+
+
+def timed(sql, params, rounds):
+    """返回平均耗时（毫秒）和结果行数"""
+    rows = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        rows = Database.execute_query(sql, params)
+    return (time.perf_counter() - start) * 1000 / rounds, len(rows)
+
+
+def compare(start_city, end_city, rounds):
+    day = date.today()
+    like_sql = BASE_SQL + " AND st_start.city LIKE %s AND st_end.city LIKE %s"
+    like_params = [day, f'%{start_city}%', f'%{end_city}%']
+
+    index = StationIndex(Database.execute_query(
+        "SELECT station_id, station_name, city FROM Station"
+    ))
+    start_ids = sorted(index.resolve(start_city))
+    end_ids = sorted(index.resolve(end_city))
+    if not start_ids or not end_ids:
+        print("城市无匹配车站")
+        return
+    in_sql = BASE_SQL + " AND r.start_station_id IN ({}) AND r.end_station_id IN ({})".format(
+        ','.join(['%s'] * len(start_ids)), ','.join(['%s'] * len(end_ids))
+    )
+    in_params = [day] + start_ids + end_ids
+
+    total = Database.execute_query("SELECT COUNT(*) AS total FROM Schedule", fetch_one=True)['total']
+    print(f"Schedule 表共 {total} 行，查询 {start_city} -> {end_city}，每种查询执行 {rounds} 次")
+
+    for name, sql, params in (('LIKE', like_sql, like_params), ('IN', in_sql, in_params)):
+        for row in Database.execute_query("EXPLAIN " + sql, params):
+            print(f"  [{name}] {row['table']:<10} type={row['type']:<6} key={row['key']} rows={row['rows']}")
+        elapsed, count = timed(sql, params, rounds)
+        print(f"{name:<5} 平均耗时 {elapsed:.2f}ms，返回 {count} 行")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='班次查询性能测试')
+    parser.add_argument('--seed', type=int, default=0, help='生成的测试班次数')
+    parser.add_argument('--days', type=int, default=90, help='测试班次覆盖的天数')
+    parser.add_argument('--cleanup', action='store_true', help='删除测试班次')
+    parser.add_argument('--start-city', default='北京')
+    parser.add_argument('--end-city', default='上海')
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+    elif args.seed:
+        seed(args.seed, args.days)
+    else:
+        compare(args.start_city, args.end_city, args.rounds)
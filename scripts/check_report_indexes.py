@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+报表查询索引回归检查：对报表相关查询执行 EXPLAIN，确认按时间范围过滤时使用了预期的索引
+
+检查项：
+    - 销售/退票日汇总按日期范围读取（主键范围扫描）
+    - 汇总重建和报表导出按 order_time / refund_time 半开区间扫描明细表（覆盖索引）
+
+订单/退票数据过少时优化器可能选择全表扫描，可用 --seed 在同一事务中先写入指定数量的
+订单、车票和退票记录（时间均匀分布在检查范围前后，约九分之一落在范围内，
+避免范围覆盖全部数据时优化器合理地选择全表扫描），检查结束后回滚，不留下数据；
+需要库中至少有一个用户和一个有座位的班次（如执行过 sql/init_data.sql）
+
+用法（在项目根目录执行）：
+    python -m scripts.check_report_indexes --seed 20000
+    python -m scripts.check_report_indexes --start-date 2026-01-01 --end-date 2026-01-31
+检查失败时以非零状态码退出，可用于部署前检查
+"""
+import argparse
+import sys
+from app.config import Config
+from app.database import Database
+from app.sales_rollup import ORDER_ROLLUP_SQL, REFUND_ROLLUP_SQL, date_range, range_condition
+
+SEED_BATCH = 1000
+
+
+def seed(cursor, start, end, count):
+    """
+    在当前事务中写入 count 个订单（每个订单一张已退车票和一条退票记录），
+    时间均匀分布在 [start - 4 * 跨度, end + 4 * 跨度) 内
+    :return: 是否写入成功
+    """
+    cursor.execute(
+        """SELECT s.schedule_id, se.seat_id, u.user_id
+           FROM Schedule s
+           JOIN Seat se ON se.vehicle_id = s.vehicle_id
+           CROSS JOIN (SELECT user_id FROM User LIMIT 1) u
+           LIMIT 1"""
+    )
+    base = cursor.fetchone()
+    if not base:
+        print("[FAIL] 无法生成测试数据：需要至少一个用户和一个有座位的班次")
+        return False
+
+    span = end - start
+    first = start - span * 4
+    step = span * 9 / count
+    for offset in range(0, count, SEED_BATCH):
+        times = [first + step * i for i in range(offset, min(offset + SEED_BATCH, count))]
+        cursor.executemany(
+            """INSERT INTO `Order` (user_id, schedule_id, order_time, total_amount, ticket_count, order_type, status)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            [(base['user_id'], base['schedule_id'], t, 100, 1, 'individual', 'refunded') for t in times]
+        )
+        # 多行 INSERT 分配的自增ID连续
+        first_order_id = cursor.lastrowid
+        cursor.executemany(
+            """INSERT INTO Ticket (order_id, schedule_id, seat_id, passenger_name, card_id, price,
+                                   from_station_id, to_station_id, segment_mask, status)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            [(first_order_id + i, base['schedule_id'], base['seat_id'], 'index-check', f'{offset + i:018d}',
+              100, None, None, 1, 'refunded') for i in range(len(times))]
+        )
+        first_ticket_id = cursor.lastrowid
+        cursor.executemany(
+            """INSERT INTO Refund (ticket_id, refund_time, refund_amount, refund_reason, handled_by)
+               VALUES (%s, %s, %s, %s, %s)""",
+            [(first_ticket_id + i, t, 100, 'index-check', None) for i, t in enumerate(times)]
+        )
+    print(f"已在事务中写入 {count} 个订单、车票和退票记录（结束后回滚）")
+    return True
+
+
+def explain(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    return cursor.fetchall()
+
+
+def check(cursor, name, sql, params, table, keys, covering=False):
+    """
+    :param table: 需要检查的表（EXPLAIN 中的 table 列）
+    :param keys: 允许使用的索引
+    :param covering: 是否要求只读索引（Extra 包含 Using index）
+    :return: 是否通过
+    """
+    rows = [row for row in explain(cursor, sql, params) if row['table'] == table]
+    if not rows:
+        print(f"[FAIL] {name}: EXPLAIN 中没有表 {table}")
+        return False
+    row = rows[0]
+    extra = row.get('Extra') or ''
+    problems = []
+    if row['key'] not in keys:
+        problems.append(f"key={row['key']}，期望 {'/'.join(keys)}")
+    if row['type'] not in ('range', 'ref', 'eq_ref', 'const'):
+        problems.append(f"type={row['type']}")
+    if covering and 'Using index' not in extra:
+        problems.append('未使用覆盖索引')
+    status = 'FAIL' if problems else ' OK '
+    print(f"[{status}] {name}: type={row['type']} key={row['key']} rows={row['rows']} extra={extra}")
+    for problem in problems:
+        print(f"        {problem}")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='报表查询索引回归检查')
+    parser.add_argument('--start-date', default='2025-01-01')
+    parser.add_argument('--end-date', default='2025-01-31')
+    parser.add_argument('--seed', type=int, default=0, help='检查前在事务中写入的订单数（检查后回滚）')
+    args = parser.parse_args()
+
+    start, end = date_range(args.start_date, args.end_date)
+    slots = Config.ROLLUP_SLOTS
+
+    sale_where, sale_params = range_condition('sale_date', start.date(), end.date())
+    refund_date_where, refund_date_params = range_condition('refund_date', start.date(), end.date())
+    order_where, order_params = range_condition('order_time', start, end)
+    refund_where, refund_params = range_condition('refund_time', start, end)
+    export_where, export_params = range_condition('o.order_time', start, end)
+
+    conn = Database.get_connection()
+    cursor = conn.cursor()
+    try:
+        conn.begin()
+        if args.seed > 0 and not seed(cursor, start, end, args.seed):
+            sys.exit(1)
+        results = [
+            check(
+                cursor, '销售报表（Daily_Sales）',
+                f"SELECT sale_date, SUM(order_count) FROM Daily_Sales WHERE {sale_where} GROUP BY sale_date",
+                sale_params, 'Daily_Sales', ('PRIMARY',)
+            ),
+            check(
+                cursor, '退票报表（Daily_Refund）',
+                f"SELECT refund_date, SUM(refund_count) FROM Daily_Refund WHERE {refund_date_where} GROUP BY refund_date",
+                refund_date_params, 'Daily_Refund', ('PRIMARY',)
+            ),
+            check(
+                cursor, '销售汇总重建（Order）',
+                ORDER_ROLLUP_SQL.format(where=order_where),
+                [slots] + order_params + [slots], 'Order', ('idx_order_time',), covering=True
+            ),
+            check(
+                cursor, '退票汇总重建（Refund）',
+                REFUND_ROLLUP_SQL.format(where=refund_where),
+                [slots] + refund_params + [slots], 'Refund', ('idx_refund_time',), covering=True
+            ),
+            check(
+                cursor, '报表导出（Order）',
+                f"""SELECT o.order_id, u.username, s.schedule_no
+                    FROM `Order` o
+                    JOIN User u ON o.user_id = u.user_id
+                    JOIN Schedule s ON o.schedule_id = s.schedule_id
+                    WHERE {export_where}
+                    ORDER BY o.order_time DESC""",
+                export_params, 'o', ('idx_order_time',)
+            ),
+        ]
+    finally:
+        conn.rollback()
+        cursor.close()
+        conn.close()
+
+    failed = results.count(False)
+    print(f"共 {len(results)} 项检查，失败 {failed} 项")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
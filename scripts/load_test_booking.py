@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+订票并发压测：对比悲观锁、乐观锁与排队订票的吞吐量和死锁/冲突率
+
+先以指定策略启动服务，再运行本脚本，例如：
+    BOOKING_STRATEGY=pessimistic python run.py
+    python -m scripts.load_test_booking --schedule-id 1 --threads 20 --requests 200
+
+    BOOKING_STRATEGY=optimistic python run.py
+    python -m scripts.load_test_booking --schedule-id 1 --threads 20 --requests 200
+
+    BOOKING_MODE=queued python run.py
+    python -m scripts.load_test_booking --schedule-id 1 --threads 20 --requests 200
+
+脚本会注册压测用户，所有请求使用自动选座（不指定 seat_id），
+结束后可通过 /api/admin/inventory/reconcile 校验库存计数
+
+所有压测用户从同一 IP 注册和登录，每个线程消耗两次认证接口的 IP 限流额度，
+线程数较多时需要关闭或放宽认证限流后再启动服务，例如：
+    AUTH_RATE_LIMIT_ENABLED=0 BOOKING_STRATEGY=pessimistic python run.py
+    AUTH_RATE_IP_BURST=1000 BOOKING_STRATEGY=pessimistic python run.py
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+
+class Client:
+    """带会话Cookie的HTTP客户端"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def get(self, path):
+        try:
+            with self.opener.open(self.base_url + path, timeout=60) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            return json.loads(e.read().decode('utf-8'))
+
+    def post(self, path, data):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(data).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            return json.loads(e.read().decode('utf-8'))
+
+
+def classify(result):
+    """按返回消息归类请求结果"""
+    if result.get('success'):
+        return 'success'
+    message = result.get('message', '')
+    if '死锁' in message:
+        return 'deadlock'
+    if '并发冲突' in message:
+        return 'conflict'
+    if '余座不足' in message or '已被占用' in message:
+        return 'sold_out'
+    return 'error'
+
+
+def login_client(base_url, index, run_id):
+    client = Client(base_url)
+    username = f"load_{run_id}_{index}"
+    client.post('/api/auth/register', {
+        'username': username,
+        'password': 'load-test',
+        'real_name': '压测用户',
+        'security_question': 'q',
+        'security_answer': 'a'
+    })
+    result = client.post('/api/auth/login', {'username': username, 'password': 'load-test'})
+    if not result.get('success'):
+        raise RuntimeError(f"登录失败: {result.get('message')}")
+    return client
+
+
+def worker(client, schedule_id, group_size, jobs, stats, latencies, lock):
+    while True:
+        with lock:
+            if not jobs:
+                return
+            job = jobs.pop()
+        passengers = [
+            {'name': f'乘客{job}-{i}', 'card_id': f"{random.randint(10 ** 17, 10 ** 18 - 1)}"}
+            for i in range(group_size)
+        ]
+        start = time.perf_counter()
+        result = client.post('/api/ticket/book', {'schedule_id': schedule_id, 'passengers': passengers})
+        while result.get('status') == 'pending':
+            result = client.get(f"/api/ticket/book/{result['request_id']}?wait=10")
+        elapsed = time.perf_counter() - start
+        with lock:
+            stats[classify(result)] += 1
+            latencies.append(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='订票并发压测')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--schedule-id', type=int, required=True)
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--group-size', type=int, default=1, help='每个订单的乘客数')
+    args = parser.parse_args()
+
+    run_id = int(time.time())
+    clients = [login_client(args.base_url, i, run_id) for i in range(args.threads)]
+
+    jobs = list(range(args.requests))
+    stats = Counter()
+    latencies = []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=worker, args=(client, args.schedule_id, args.group_size, jobs, stats, latencies, lock))
+        for client in clients
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = sum(stats.values())
+    print("=" * 60)
+    print(f"请求数 {total}，并发 {args.threads}，每单 {args.group_size} 人，耗时 {elapsed:.2f}s")
+    print(f"吞吐量 {total / elapsed:.1f} 请求/秒，成功 {stats['success'] / elapsed:.1f} 单/秒")
+    for key in ('success', 'sold_out', 'deadlock', 'conflict', 'error'):
+        print(f"  {key:<9} {stats[key]:>6}  ({stats[key] * 100 / max(total, 1):.1f}%)")
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"延迟 p50 {p50 * 1000:.1f}ms，p99 {p99 * 1000:.1f}ms")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -153,6 +153,7 @@ CREATE TABLE Schedule (
     INDEX idx_route_id (route_id),
     INDEX idx_vehicle_id (vehicle_id),
     INDEX idx_departure_date (departure_date),
+    INDEX idx_date_route (departure_date, route_id),
     INDEX idx_status (status),
     FOREIGN KEY (route_id) REFERENCES Route(route_id),
     FOREIGN KEY (vehicle_id) REFERENCES Vehicle(vehicle_id),
@@ -160,6 +161,16 @@ CREATE TABLE Schedule (
     CHECK (delay_minutes >= 0)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='班次表';
 
+-- 班次余票库存表（冗余计数，由订票/退票事务维护）
+CREATE TABLE Schedule_Inventory (
+    schedule_id INT PRIMARY KEY COMMENT '班次ID',
+    sold_seats INT NOT NULL DEFAULT 0 COMMENT '已售座位数（任一区段被占用即计入）',
+    version INT NOT NULL DEFAULT 0 COMMENT '版本号（每次占用变更递增，用于乐观并发控制）',
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    FOREIGN KEY (schedule_id) REFERENCES Schedule(schedule_id) ON DELETE CASCADE,
+    CHECK (sold_seats >= 0)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='班次余票库存表';
+
 -- ============================================
 -- 5. 售票业务相关表
 -- ============================================
@@ -176,8 +187,9 @@ CREATE TABLE `Order` (
     status ENUM('pending', 'confirmed', 'cancelled', 'refunded') DEFAULT 'confirmed' COMMENT '订单状态',
     INDEX idx_user_id (user_id),
     INDEX idx_schedule_id (schedule_id),
-    INDEX idx_order_time (order_time),
+    INDEX idx_order_time (order_time, status, order_type, ticket_count, total_amount),  -- 覆盖报表按时间范围的汇总查询
     INDEX idx_status (status),
+    INDEX idx_user_order_time (user_id, order_time, order_id),
     FOREIGN KEY (user_id) REFERENCES User(user_id) ON DELETE CASCADE,
     FOREIGN KEY (schedule_id) REFERENCES Schedule(schedule_id),
     CHECK (total_amount >= 0),
@@ -193,9 +205,12 @@ CREATE TABLE Ticket (
     passenger_name VARCHAR(50) NOT NULL COMMENT '乘客姓名',
     card_id VARCHAR(18) NOT NULL COMMENT '身份证号',
     price DECIMAL(10,2) NOT NULL COMMENT '票价',
+    from_station_id INT COMMENT '上车站ID',
+    to_station_id INT COMMENT '下车站ID',
+    segment_mask BIGINT UNSIGNED NOT NULL COMMENT '占用区段位掩码',
     status ENUM('valid', 'refunded') DEFAULT 'valid' COMMENT '车票状态',
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
-    UNIQUE INDEX uk_schedule_seat_valid (schedule_id, seat_id, status),
+    INDEX idx_schedule_seat (schedule_id, seat_id),
     INDEX idx_order_id (order_id),
     INDEX idx_schedule_id (schedule_id),
     INDEX idx_seat_id (seat_id),
@@ -208,6 +223,17 @@ CREATE TABLE Ticket (
     CHECK (price >= 0)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='车票表';
 
+-- 座位区段占用表（同一座位可按不重叠的区段多次售出，订票时锁定该行做冲突检查，
+-- 写入时用条件 UPDATE（segment_mask & 新区段 = 0）保证同一区段不会被重复售出）
+CREATE TABLE Seat_Occupancy (
+    schedule_id INT NOT NULL COMMENT '班次ID',
+    seat_id INT NOT NULL COMMENT '座位ID',
+    segment_mask BIGINT UNSIGNED NOT NULL DEFAULT 0 COMMENT '已占用区段位掩码',
+    PRIMARY KEY (schedule_id, seat_id),
+    FOREIGN KEY (schedule_id) REFERENCES Schedule(schedule_id) ON DELETE CASCADE,
+    FOREIGN KEY (seat_id) REFERENCES Seat(seat_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='座位区段占用表';
+
 -- 退票记录表
 CREATE TABLE Refund (
     refund_id INT PRIMARY KEY AUTO_INCREMENT COMMENT '退票ID',
@@ -216,12 +242,47 @@ CREATE TABLE Refund (
     refund_amount DECIMAL(10,2) NOT NULL COMMENT '退款金额',
     refund_reason TEXT COMMENT '退票原因',
     handled_by INT COMMENT '处理人ID',
-    INDEX idx_refund_time (refund_time),
+    INDEX idx_refund_time (refund_time, refund_amount),  -- 覆盖报表按时间范围的汇总查询
     FOREIGN KEY (ticket_id) REFERENCES Ticket(ticket_id),
     FOREIGN KEY (handled_by) REFERENCES User(user_id),
     CHECK (refund_amount >= 0)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='退票记录表';
 
+-- ============================================
+-- 6. 报表汇总表（由订票/退票事务增量维护）
+-- ============================================
+
+-- 销售日汇总表（每天按订单ID取模拆分为多行，避免热点行锁）
+CREATE TABLE Daily_Sales (
+    sale_date DATE NOT NULL COMMENT '下单日期',
+    slot TINYINT UNSIGNED NOT NULL COMMENT '汇总槽位',
+    order_count INT NOT NULL DEFAULT 0 COMMENT '有效订单数',
+    refunded_count INT NOT NULL DEFAULT 0 COMMENT '已退订单数',
+    ticket_count INT NOT NULL DEFAULT 0 COMMENT '有效订单票数',
+    total_sales DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '有效订单金额',
+    refunded_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '已退订单金额',
+    group_order_count INT NOT NULL DEFAULT 0 COMMENT '有效团体订单数',
+    PRIMARY KEY (sale_date, slot)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='销售日汇总表';
+
+-- 退票日汇总表
+CREATE TABLE Daily_Refund (
+    refund_date DATE NOT NULL COMMENT '退票日期',
+    slot TINYINT UNSIGNED NOT NULL COMMENT '汇总槽位',
+    refund_count INT NOT NULL DEFAULT 0 COMMENT '退票张数',
+    total_refund_amount DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '退款金额',
+    PRIMARY KEY (refund_date, slot)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='退票日汇总表';
+
+-- 班次销售汇总表
+CREATE TABLE Schedule_Sales (
+    schedule_id INT PRIMARY KEY COMMENT '班次ID',
+    order_count INT NOT NULL DEFAULT 0 COMMENT '有效订单数',
+    refunded_order_count INT NOT NULL DEFAULT 0 COMMENT '已退订单数',
+    total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT '有效订单金额',
+    FOREIGN KEY (schedule_id) REFERENCES Schedule(schedule_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='班次销售汇总表';
+
 -- ============================================
 -- 创建管理员账号
 -- ============================================
@@ -200,6 +200,16 @@ INSERT INTO Schedule (schedule_no, route_id, vehicle_id, departure_date, departu
 ('粤A-002', 7, 10, CURDATE(), '14:00:00', '16:00:00', 50.0, 'normal');
 
 
+-- ============================================
+-- 7. 初始化班次库存
+-- ============================================
+
+INSERT INTO Schedule_Inventory (schedule_id, sold_seats)
+SELECT schedule_id, 0 FROM Schedule;
+
+-- 报表汇总表（Daily_Sales、Daily_Refund、Schedule_Sales）由订票/退票事务维护，
+-- 导入历史订单后调用 /api/admin/report/rollup/rebuild 重建
+
 
 -- 管理员用户（密码为明文，用于测试）
 INSERT INTO User (username, password, real_name, security_question, security_answer, is_admin) VALUES